@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+import csv
+import io
+import zlib
+from datetime import datetime
+from enum import Enum
+from typing import Any, Iterator
+
+from api.models.run import Hash, HashParams, HashExportFormat
+from api.factory.runs import iter_hash_runs
+from common.log import get_logger
+from source.database import get_db_handler
+
+log = get_logger()
+
+# compressed output is sent once at least this many bytes are available
+chunk_size = 64 * 1024
+
+
+def format_csv_value(value: Any) -> str:
+
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, list):
+        return ",".join([format_csv_value(x) for x in value])
+
+    return str(value)
+
+
+def export_hash_runs(export_format: HashExportFormat, since: int = None) -> Iterator[bytes]:
+    """
+        yield all Hash runs as gzip compressed CSV or NDJSON. Runs are serialized and compressed
+        one by one, this way memory usage does not depend on the number of runs.
+
+        Parameters
+        ----------
+        export_format: HashExportFormat
+            csv or ndjson
+        since: int
+            only export runs which have been updated after this unix timestamp
+
+        Returns
+        -------
+        generator: chunks of gzip compressed data
+    """
+
+    # noinspection PyArgumentList
+    params = HashParams(last_update__gt=since)
+
+    # wbits 31 writes a gzip header and trailer
+    compressor = zlib.compressobj(wbits=31)
+
+    line = io.StringIO()
+    writer = csv.writer(line, lineterminator="\n")
+    fields = list(Hash.__fields__)
+
+    if export_format == HashExportFormat.csv:
+        writer.writerow(fields)
+
+    # the export is consumed while other requests use the shared DB session
+    conn = get_db_handler().copy()
+
+    runs = iter_hash_runs(params, conn=conn)
+    buffer = bytearray()
+    num_runs = 0
+    try:
+        for run in runs:
+
+            if export_format == HashExportFormat.csv:
+                writer.writerow([format_csv_value(getattr(run, x)) for x in fields])
+            else:
+                line.write(run.json() + "\n")
+
+            buffer += compressor.compress(line.getvalue().encode("utf-8"))
+            line.seek(0)
+            line.truncate()
+            num_runs += 1
+
+            if len(buffer) >= chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+    finally:
+        runs.close()
+        conn.close()
+
+    # header row of an empty csv export is written here
+    buffer += compressor.compress(line.getvalue().encode("utf-8"))
+    buffer += compressor.flush()
+
+    log.debug(f"exported '{num_runs}' run/event results as {export_format.value}")
+
+    yield bytes(buffer)
+
+# EOF
@@ -7,19 +7,25 @@
 #  For a copy, see file LICENSE.txt included in this
 #  repository or visit: <https://opensource.org/licenses/MIT>.
 
-from datetime import datetime
+from datetime import datetime, timedelta
 import html
-import re
-from typing import List, Any
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Set, Tuple, Union
 
 from pydantic import ValidationError
 import pytz
 
-from api.models.run import Hash, HashParams, HashScope
+from api.models.run import Hash, HashParams, HashScope, HashStats
 import config
 from common.log import get_logger
+from common.dates import get_timezone, parse_date_time
+from common.geo_index import haversine_km
+from common.map_url import format_map_url, parse_map_url
 from common.misc import php_deserialize
-from source.database import get_db_handler
+from common.text_index import FullTextIndex
+from source.database import get_db_handler, DBConnection, QueryPlan
+from source.event_store import get_event_store, EventStore
+from source.run_stats import RunStatistics
 
 log = get_logger()
 
@@ -49,7 +55,7 @@ def get_event_manager_field_data(event_manager_fields: dict, field_name: str, fi
                 ret_list.append(field)
             return ret_list
         elif field_data.get("type") == "timezone":
-            return pytz.timezone(field_value)
+            return get_timezone(field_value)
         else:
             return field_value
     except Exception:
@@ -58,258 +64,847 @@ def get_event_manager_field_data(event_manager_fields: dict, field_name: str, fi
     return None
 
 
-def passes_filter_params(params: HashParams, hash_event: Hash) -> bool:
+def get_event_manager_form_fields() -> Union[dict, None]:
+    """
+        return deserialized Event Manager form field definitions, cached in event store if present
+    """
 
-    def compare_attributes(value_a, value_b):
+    option_name = "event_manager_submit_event_form_fields"
 
-        if type(value_a) == type(value_b):
-            if "__gt" in key and value_b > value_a:
-                return True
-            elif "__lt" in key and value_b < value_a:
+    store = get_event_store()
+    if store is not None:
+        form_fields = store.options.get(option_name)
+        if form_fields is not None:
+            return form_fields
+
+    form_fields = php_deserialize(get_db_handler().get_config_item(option_name))
+
+    if store is not None and form_fields is not None:
+        store.options.set(option_name, form_fields)
+
+    return form_fields
+
+
+def compile_filter_param(key: str, value: Any) -> Tuple[int, Callable[[Hash], bool]]:
+    """
+        compile a single filter param into a predicate
+
+        Returns
+        -------
+        tuple: rank of expected selectivity (lower is more selective), predicate
+    """
+
+    # compare start date or run number, greater and lower than also match equal values
+    for field in ["start_date", "run_number"]:
+        if not key.startswith(field):
+            continue
+
+        value_type = type(value)
+        greater = "__gt" in key
+        lower = "__lt" in key
+
+        def compare_attribute(hash_event: Hash) -> bool:
+            event_value = getattr(hash_event, field)
+            if type(event_value) != value_type:
+                return False
+            if greater is True and event_value > value:
                 return True
-            elif value_b == value_a:
+            if lower is True and event_value < value:
                 return True
+            return event_value == value
+
+        return 2 if greater or lower else 0, compare_attribute
+
+    # case insensitive substring match
+    if type(value) == str:
+        value = value.lower()
+
+        def contains(hash_event: Hash) -> bool:
+            event_value = getattr(hash_event, key, None)
+            return type(event_value) == str and value in event_value.lower()
+
+        return 1, contains
+
+    if type(value) == HashScope:
+        return 3, lambda hash_event: value == getattr(hash_event, key, None)
 
-        return False
+    if type(value) == bool:
+        return 4, lambda hash_event: value is getattr(hash_event, key, None)
 
-    matches = list()
+    # no other type of param can match
+    return 0, lambda hash_event: False
+
+
+def compile_filter_params(params: HashParams) -> Callable[[Hash], bool]:
+    """
+        compile filter params into a single predicate which returns True if a Hash run matches all filters.
+        Filters are evaluated most selective first and evaluation stops at the first filter which
+        doesn't match.
+
+        Parameters
+        ----------
+        params: HashParams
+            params to filter runs for
+
+        Returns
+        -------
+        function: predicate which expects a Hash run
+    """
+
+    predicates = list()
     for key, value in params.dict().items():
 
         # skip unsupported keys like: __pydantic_initialised__
         if key.startswith("__"):
             continue
 
-        if value is None or key in ["id", "limit"]:
+        if value is None or key in ["id", "limit", "q", "near", "radius_km"]:
             continue
 
         # handled directly via DB query
         if key.startswith("last_update"):
             continue
 
-        event_value = getattr(hash_event, key, None)
-        if type(value) == type(event_value) == str and value.lower() in event_value.lower():
-            matches.append(True)
-            continue
+        predicates.append(compile_filter_param(key, value))
 
-        if type(value) == type(event_value) == bool and value == event_value:
-            matches.append(True)
-            continue
+    predicates = [predicate for _, predicate in sorted(predicates, key=lambda x: x[0])]
 
-        if type(value) == HashScope and value == event_value:
-            matches.append(True)
-            continue
+    def passes(hash_event: Hash) -> bool:
+        for predicate in predicates:
+            if predicate(hash_event) is False:
+                return False
+        return True
 
-        if key.startswith("start_date") and compare_attributes(value, getattr(hash_event, "start_date")):
-            matches.append(True)
-            continue
+    return passes
 
-        if key.startswith("run_number") and compare_attributes(value, getattr(hash_event, "run_number")):
-            matches.append(True)
-            continue
 
-        matches.append(False)
+def passes_filter_params(params: HashParams, hash_event: Hash) -> bool:
 
-    return False if False in matches else True
+    return compile_filter_params(params)(hash_event)
 
 
-def get_hash_runs(params: HashParams) -> List[Hash]:
+def has_last_update_filter(params: HashParams) -> bool:
+
+    return any([x is not None for x in [params.last_update, params.last_update__gt, params.last_update__lt]])
+
+
+def get_meta_conditions(params: HashParams) -> Dict[str, Callable[[Any], bool]]:
     """
+        translate filter params into conditions on raw post meta values which every matching run
+        has to fulfill. Used to look up candidate posts via meta data, the filters still get applied
+        to the parsed runs.
 
+        Returns
+        -------
+        dict: meta key: predicate which expects a raw meta value
     """
 
-    conn = get_db_handler()
+    def parse_int(value: Any) -> Union[int, None]:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return
+
+    def between(lower: Any, upper: Any, convert: Callable[[Any], Any]) -> Callable[[Any], bool]:
+        def predicate(meta_value: Any) -> bool:
+            value = convert(meta_value)
+            return value is not None and (lower is None or value >= lower) and (upper is None or value <= upper)
+        return predicate
+
+    def kennel_matches(kennel_filter: str, form_fields: dict) -> Callable[[Any], bool]:
+        def predicate(meta_value: Any) -> bool:
+            kennel_name = get_event_manager_field_data(form_fields, "_hash_kennel", meta_value)
+            return kennel_name in config.app_settings.hash_kennels and kennel_filter in kennel_name.lower()
+        return predicate
+
+    conditions = dict()
+    for key, value in params.dict().items():
 
-    post_query_data = {
-        "post_id": params.id
-    }
+        if value is None:
+            continue
 
-    # filter last update directly via db query
-    if params.last_update is not None:
-        post_query_data["last_update"] = params.last_update
-        post_query_data["compare_type"] = "eq"
-    elif params.last_update__lt is not None:
-        post_query_data["last_update"] = params.last_update__lt
-        post_query_data["compare_type"] = "lt"
-    elif params.last_update__gt is not None:
-        post_query_data["last_update"] = params.last_update__gt
-        post_query_data["compare_type"] = "gt"
+        # greater and lower than also match equal values
+        if key.startswith("run_number"):
+            conditions["_hash_run_number"] = between(value if "__lt" not in key else None,
+                                                     value if "__gt" not in key else None, parse_int)
 
-    posts = conn.get_posts(**post_query_data)
+        # start dates are stored in the time zone of the event, compare them with one day of tolerance
+        if key.startswith("start_date"):
+            conditions["_event_start_date"] = between(value - timedelta(days=1) if "__lt" not in key else None,
+                                                      value + timedelta(days=1) if "__gt" not in key else None,
+                                                      lambda x: parse_date_time(x, pytz.utc))
 
-    return_list = list()
-    if isinstance(posts, list):
-        post_ids = [post.get("id") for post in posts]
-    else:
-        log.error(f"DB query should return a list, got {type(posts)}")
-        return return_list
+        # runs without valid kennel get the default kennel, these have no meta value to look up
+        if key == "kennel_name" and value.lower() not in config.app_settings.hash_kennels[0].lower():
+            conditions["_hash_kennel"] = kennel_matches(value.lower(), get_event_manager_form_fields())
 
-    if len(posts) == 0:
-        return return_list
+    return conditions
 
-    post_meta = conn.get_posts_meta(post_ids)
-    event_manager_form_fields = php_deserialize(conn.get_config_item("event_manager_submit_event_form_fields"))
 
-    for post in posts:
+def get_required_fields(params: HashParams, fields: List[str] = None) -> Union[Set[str], None]:
+    """
+        return run attributes which need to be parsed to return the requested 'fields' and
+        to apply all filters of 'params'
 
-        post_attr = {x.get("meta_key"): x.get("meta_value") for x in
-                     [d for d in post_meta
-                      if d.get("post_id") == post.get("id") and len(str(d.get("meta_value"))) != 0
-                      ]
-                     }
+        Returns
+        -------
+        set: names of run attributes, None if all attributes are required
+    """
 
-        # if start date is not set, ignore event
-        if post_attr.get("_event_start_date") is None:
-            continue
+    if fields is None:
+        return
 
-        if post.get("post_content") is None or len(post.get("post_content")) == 0:
-            continue
+    required_fields = set(fields)
+    for key, value in params.dict().items():
 
-        hash_data = {
-            "id": post.get("id"),
-            "last_update": post.get("post_modified"),
-            "event_name": post.get("post_title"),
-            "kennel_name": config.app_settings.hash_kennels[0],
-            "event_description": post.get("post_content"),
-            "event_type": post.get("post_type") or config.app_settings.default_run_type,
-            "event_geographic_scope": HashScope.Unspecified,
-            "start_date": post_attr.get("_event_start_date"),
-            "end_date": post_attr.get("_event_end_date"),
-            "run_number": post_attr.get("_hash_run_number"),
-            "run_is_counted": True,
-            "deleted": True,
-            "hares": post_attr.get("_hash_hares"),
-            "contact": post_attr.get("_hash_contact"),
-            "geo_lat": post_attr.get("geolocation_lat"),
-            "geo_long": post_attr.get("geolocation_long"),
-            "geo_location_name": post_attr.get("geolocation_formatted_address"),
-            "geo_map_url": post_attr.get("_hash_geo_map_url"),
-            "location_name": post_attr.get("_event_location"),
-            "location_additional_info": post_attr.get("_hash_location_specifics"),
-            "facebook_group_id": config.app_settings.default_facebook_group_id,
-            "hash_cash_members": config.app_settings.default_hash_cash,
-            "hash_cash_non_members": config.app_settings.default_hash_cash_non_members,
-            "event_currency": config.app_settings.default_currency,
-            "hash_cash_extras": post_attr.get("_hash_cash_extras"),
-            "extras_description": post_attr.get("_hash_extras_description"),
-            "event_hidden": True if post_attr.get("_hash_event_hidden") == '1' else False
-        }
-
-        # validate time attributes
-        try:
-            datetime.strptime(hash_data.get("start_date"), '%Y-%m-%d %H:%M:%S')
-        except ValueError:
-            log.error(f"Start date '{hash_data.get('start_date')}' is not set or missing the time string")
+        if value is None or key.startswith("__"):
             continue
 
-        if hash_data.get("end_date") is not None:
-            try:
-                datetime.strptime(hash_data.get("end_date"), '%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                log.warning(f"End date '{hash_data.get('end_date')}' is not set or missing the time string")
-                hash_data["end_date"] = None
+        if key == "q":
+            required_fields.update(EventStore.search_fields)
+        elif key == "near":
+            required_fields.update(["geo_lat", "geo_long"])
+        elif key.split("__")[0] in Hash.__fields__:
+            required_fields.add(key.split("__")[0])
 
-        # only published and expired events count as not deleted
-        if post.get("post_status") in ["publish", "expired"] and post_attr.get("_cancelled") == "0":
-            hash_data["deleted"] = False
+    return required_fields
 
-        # update hash cash if present
-        if post_attr.get("_hash_cash") is not None and len(str(post_attr.get("_hash_cash"))) > 0:
-            hash_data["hash_cash_members"] = post_attr.get("_hash_cash")
 
-        if post_attr.get("_hash_cash_non_members") is not None and \
-                len(str(post_attr.get("_hash_cash_non_members"))) > 0:
+def parse_hash_run(post: dict, post_attr: dict, event_manager_form_fields: dict,
+                   fields: Set[str] = None) -> Union[Hash, None]:
+    """
+        parse a WordPress post and its meta data into a Hash run object
+
+        Parameters
+        ----------
+        post: dict
+            post as returned by DBConnection.get_posts()
+        post_attr: dict
+            post meta data of this post as meta_key: meta_value
+        event_manager_form_fields: dict
+            deserialized Event Manager form field definitions
+        fields: set
+            only derive these optional run attributes (image url, event attributes, map link, ...),
+            all others are left empty. All attributes are parsed if not set.
+
+        Returns
+        -------
+        Hash: parsed Hash run, None if post could not be parsed
+    """
 
-            hash_data["hash_cash_non_members"] = post_attr.get("_hash_cash_non_members")
-        elif hash_data.get("hash_cash_non_members") is None:
-            hash_data["hash_cash_non_members"] = hash_data.get("hash_cash_members")
+    # if start date is not set, ignore event
+    if post_attr.get("_event_start_date") is None:
+        return
 
-        # get event url and unescape the link
-        # noinspection PyBroadException
-        try:
+    # if content has not been fetched yet, only its length is known
+    if "post_content" in post:
+        content_length = len(post.get("post_content") or "")
+    else:
+        content_length = post.get("post_content_length") or 0
+
+    if content_length == 0:
+        return
+
+    event_time_zone = get_event_manager_field_data(event_manager_form_fields,
+                                                   "_event_timezone", post_attr.get("_event_timezone"))
+
+    if event_time_zone is None and config.app_settings.timezone_string is not None:
+        event_time_zone = config.app_settings.timezone_string
+
+    # parse time attributes once and add timezone information
+    start_date = parse_date_time(post_attr.get("_event_start_date"), event_time_zone)
+    if start_date is None:
+        log.error(f"Start date '{post_attr.get('_event_start_date')}' is not set or missing the time string")
+        return
+
+    end_date = None
+    if post_attr.get("_event_end_date") is not None and (fields is None or "end_date" in fields):
+        end_date = parse_date_time(post_attr.get("_event_end_date"), event_time_zone)
+        if end_date is None:
+            log.warning(f"End date '{post_attr.get('_event_end_date')}' is not set or missing the time string")
+
+    last_update = post.get("post_modified")
+    if config.app_settings.timezone_string is not None and isinstance(last_update, datetime):
+        last_update = config.app_settings.timezone_string.localize(last_update)
+
+    hash_data = {
+        "id": post.get("id"),
+        "last_update": last_update,
+        "event_name": post.get("post_title"),
+        "kennel_name": config.app_settings.hash_kennels[0],
+        # empty description (None) until content got fetched
+        "event_description": post.get("post_content", ""),
+        "event_type": post.get("post_type") or config.app_settings.default_run_type,
+        "event_geographic_scope": HashScope.Unspecified,
+        "start_date": start_date,
+        "end_date": end_date,
+        "run_number": post_attr.get("_hash_run_number"),
+        "run_is_counted": True,
+        "deleted": True,
+        "hares": post_attr.get("_hash_hares"),
+        "contact": post_attr.get("_hash_contact"),
+        "geo_lat": post_attr.get("geolocation_lat"),
+        "geo_long": post_attr.get("geolocation_long"),
+        "geo_location_name": post_attr.get("geolocation_formatted_address"),
+        "geo_map_url": post_attr.get("_hash_geo_map_url"),
+        "location_name": post_attr.get("_event_location"),
+        "location_additional_info": post_attr.get("_hash_location_specifics"),
+        "facebook_group_id": config.app_settings.default_facebook_group_id,
+        "hash_cash_members": config.app_settings.default_hash_cash,
+        "hash_cash_non_members": config.app_settings.default_hash_cash_non_members,
+        "event_currency": config.app_settings.default_currency,
+        "hash_cash_extras": post_attr.get("_hash_cash_extras"),
+        "extras_description": post_attr.get("_hash_extras_description"),
+        "event_hidden": True if post_attr.get("_hash_event_hidden") == '1' else False
+    }
+
+    # only published and expired events count as not deleted
+    if post.get("post_status") in ["publish", "expired"] and post_attr.get("_cancelled") == "0":
+        hash_data["deleted"] = False
+
+    # update hash cash if present
+    if post_attr.get("_hash_cash") is not None and len(str(post_attr.get("_hash_cash"))) > 0:
+        hash_data["hash_cash_members"] = post_attr.get("_hash_cash")
+
+    if post_attr.get("_hash_cash_non_members") is not None and \
+            len(str(post_attr.get("_hash_cash_non_members"))) > 0:
+
+        hash_data["hash_cash_non_members"] = post_attr.get("_hash_cash_non_members")
+    elif hash_data.get("hash_cash_non_members") is None:
+        hash_data["hash_cash_non_members"] = hash_data.get("hash_cash_members")
+
+    # get event url and unescape the link
+    # noinspection PyBroadException
+    try:
+        if fields is None or "event_url" in fields:
             hash_data["event_url"] = html.unescape(post.get("guid"))
-        except Exception:
-            pass
+    except Exception:
+        pass
 
-        # get image url from php serializer
+    # get image url from php serializer
+    if fields is None or "image_url" in fields:
         hash_data["image_url"] = get_event_manager_field_data(
             event_manager_form_fields, "_event_banner", post_attr.get("_event_banner"))
 
-        # get kennel name
+    # get kennel name
+    if fields is None or "kennel_name" in fields:
         kennel_name = get_event_manager_field_data(
             event_manager_form_fields, "_hash_kennel", post_attr.get("_hash_kennel"))
 
         if kennel_name is not None and kennel_name in config.app_settings.hash_kennels:
             hash_data["kennel_name"] = kennel_name
 
-        # get event geo scope
-        event_geographic_scope = post_attr.get("_hash_scope")
-        if event_geographic_scope is not None and event_geographic_scope in [e.value for e in HashScope]:
-            hash_data["event_geographic_scope"] = event_geographic_scope
+    # get event geo scope
+    event_geographic_scope = post_attr.get("_hash_scope")
+    if event_geographic_scope is not None and event_geographic_scope in [e.value for e in HashScope]:
+        hash_data["event_geographic_scope"] = event_geographic_scope
 
-        # get event attributes
+    # get event attributes
+    if fields is None or "event_attributes" in fields:
         event_attributes = get_event_manager_field_data(
             event_manager_form_fields, "_hash_attributes", post_attr.get("_hash_attributes"))
 
         if event_attributes is not None and isinstance(event_attributes, list):
             hash_data["event_attributes"] = event_attributes
 
-        # handle geo_map_url
-        if hash_data.get("geo_map_url") is None:
-            if hash_data.get("geo_lat") is not None and hash_data.get("geo_long") is not None:
+    # handle geo_map_url, map link and coordinates are only validated and derived if requested
+    if fields is not None and fields.isdisjoint(["geo_lat", "geo_long", "geo_map_url"]):
+        hash_data["geo_map_url"] = None
+    elif hash_data.get("geo_map_url") is None:
+        if hash_data.get("geo_lat") is not None and hash_data.get("geo_long") is not None:
+
+            hash_data["geo_map_url"] = format_map_url(config.app_settings.maps_url_template,
+                                                      hash_data.get("geo_lat"), hash_data.get("geo_long"))
+
+    # Parse coordinates out of map link (e.g. https://www.openstreetmap.org/#map=15/52.4512/13.4471)
+    else:
+        coordinates = parse_map_url(hash_data.get("geo_map_url"))
+        if coordinates is not None:
+            hash_data["geo_lat"], hash_data["geo_long"] = coordinates
+
+    # parse event data
+    try:
+        run = Hash(**hash_data)
+    except ValidationError as e:
+        e = str(e).replace('\n', ":")
+        log.error(f"Event (id: {post.get('id')}) parsing error: {e}")
+        return
+
+    return run
+
+
+def get_hash_run(post_id: int, fields: List[str] = None) -> Union[Hash, None]:
+    """
+        fast path to fetch a single Hash run. Post and meta data are fetched with a single
+        query and no filters are evaluated.
+
+        Parameters
+        ----------
+        post_id: int
+            post id of the run
+        fields: list
+            run attributes which will be returned, all if not set
+
+        Returns
+        -------
+        Hash: the Hash run, None if run was not found
+    """
+
+    rows = get_db_handler().get_post_with_meta(post_id)
 
-                hash_data["geo_map_url"] = config.app_settings.maps_url_template.format(
-                    lat=hash_data.get("geo_lat"),
-                    long=hash_data.get("geo_long")
-                )
+    store = get_event_store()
+    if store is not None:
+        store.track_post_ids([x.get("id") for x in rows[:1]], queried_post_ids=[post_id])
 
-        # Parse coordinates out of OSM link (e.g. https://www.openstreetmap.org/#map=15/52.4512/13.4471)
+    if len(rows) == 0:
+        return
+
+    post = rows[0]
+
+    if store is not None:
+        run = store.get(post_id, post.get("post_modified"))
+        if run is not None:
+            return run
+
+    post_attr = {x.get("meta_key"): x.get("meta_value") for x in rows
+                 if x.get("meta_key") is not None and len(str(x.get("meta_value"))) != 0}
+
+    # stored runs need to be complete
+    run = parse_hash_run(post, post_attr, get_event_manager_form_fields(),
+                         set(fields) if fields is not None and store is None else None)
+
+    if store is not None:
+        if run is not None:
+            store.set(run, post.get("post_modified"))
         else:
-            pattern = r"#map=\d+/(?P<latitude>[-]?\d+\.\d+)/(?P<longitude>[-]?\d+\.\d+)"
-            if "google" in hash_data.get("geo_map_url"):
-                pattern = r".*\!3d(?P<latitude>[-]?\d+\.\d+)\!4d(?P<longitude>[-]?\d+\.\d+).*"
+            store.discard(post_id)
 
-            match = re.search(pattern, hash_data.get("geo_map_url"))
-            if match:
-                hash_data["geo_lat"] = float(match.group("latitude"))
-                hash_data["geo_long"] = float(match.group("longitude"))
+    return run
 
-        # parse event data
-        try:
-            run = Hash(**hash_data)
-        except ValidationError as e:
-            e = str(e).replace('\n', ":")
-            log.error(f"Event (id: {post.get('id')}) parsing error: {e}")
-            continue
 
-        event_time_zone = get_event_manager_field_data(event_manager_form_fields,
-                                                       "_event_timezone", post_attr.get("_event_timezone"))
+def get_db_hash_runs(params: HashParams, post_ids: List[int] = None, conn: DBConnection = None,
+                     lazy_content: bool = False, fields: Set[str] = None,
+                     page_size: int = None, candidate_post_ids: List[int] = None) -> Iterator[Tuple[Hash, bool]]:
+    """
+        fetch posts from DB and yield Hash runs in post id order. Already parsed events are reused
+        from the event store and meta data and content are only fetched for all other posts.
+
+        Parameters
+        ----------
+        params: HashParams
+            params to filter runs for, only 'id' and 'last_update' are applied via DB query
+        post_ids: list
+            only fetch runs with these post ids
+        conn: DBConnection
+            DB connection to use instead of the shared one
+        lazy_content: bool
+            don't fetch post content, the description of runs is left empty and needs to be
+            fetched for the returned runs with fetch_hash_run_descriptions(). Runs are not stored.
+            Otherwise the content of all parsed posts of a page is fetched before filters are applied,
+            as runs get stored completely.
+        fields: set
+            only parse these run attributes, only applied together with 'lazy_content'
+        page_size: int
+            size of the first page of posts, the size doubles with every page up to
+            DBConnection.posts_page_size. Used to parse only about as many posts as needed.
+        candidate_post_ids: list
+            only fetch runs with these post ids, used for candidates found by the query planner.
+            Unlike 'post_ids' these have not been requested explicitly, candidates which are not
+            returned by the DB are not considered as purged.
+
+        Returns
+        -------
+        generator: tuples of (Hash run, True if run has been reused from event store)
+    """
+
+    conn = conn or get_db_handler()
+
+    post_query_data = {
+        "post_id": params.id,
+        "post_ids": post_ids if post_ids is not None else candidate_post_ids
+    }
+
+    # filter last update directly via db query
+    if params.last_update is not None:
+        post_query_data["last_update"] = params.last_update
+        post_query_data["compare_type"] = "eq"
+    elif params.last_update__lt is not None:
+        post_query_data["last_update"] = params.last_update__lt
+        post_query_data["compare_type"] = "lt"
+    elif params.last_update__gt is not None:
+        post_query_data["last_update"] = params.last_update__gt
+        post_query_data["compare_type"] = "gt"
+
+    store = get_event_store()
+    # posts filtered by last update can exist without being returned, purges are only detected without it
+    queried_post_ids = [params.id] if params.id is not None else post_ids
+    if post_query_data.get("last_update") is not None:
+        queried_post_ids = None
+
+    complete = params.id is None and post_query_data.get("post_ids") is None and \
+        post_query_data.get("last_update") is None
+
+    # explicitly queried posts and candidates are fetched at once, all others in pages of descending
+    # post ids. This way memory usage only depends on the page size.
+    if params.id is not None or post_query_data.get("post_ids") is not None:
+        page_size = None
+    elif page_size is None or page_size > conn.posts_page_size:
+        page_size = conn.posts_page_size
+
+    all_post_ids = list()
+    parsed_post_ids = list()
+    event_manager_form_fields = None
+    while True:
+
+        # post content is only fetched for posts which need to be parsed
+        posts = conn.get_posts(**post_query_data, with_content=False, limit=page_size,
+                               before_id=all_post_ids[-1] if len(all_post_ids) > 0 else None)
+
+        if isinstance(posts, list):
+            post_ids = [post.get("id") for post in posts]
+        else:
+            log.error(f"DB query should return a list, got {type(posts)}")
+            return
+
+        all_post_ids.extend(post_ids)
+
+        # detect events which have been deleted permanently, complete listings are compared once all pages are read
+        if store is not None:
+            store.track_post_ids(post_ids, queried_post_ids=queried_post_ids)
+
+        # reuse already parsed events which have not been modified since
+        cached_runs = dict()
+        if store is not None:
+            for post in posts:
+                run = store.get(post.get("id"), post.get("post_modified"))
+                if run is not None:
+                    cached_runs[post.get("id")] = run
+
+        # only fetch meta data of posts which are not present in event store
+        meta_rows = None
+        uncached_post_ids = [x for x in post_ids if x not in cached_runs]
+        if len(uncached_post_ids) > 0:
+            # needs to be fetched before the session is occupied by the meta data stream
+            if event_manager_form_fields is None:
+                event_manager_form_fields = get_event_manager_form_fields()
+
+            if lazy_content is False:
+                post_content = conn.get_posts_content(uncached_post_ids)
+                for post in posts:
+                    if post.get("id") not in cached_runs:
+                        post["post_content"] = post_content.get(post.get("id"))
+
+            # meta data is streamed in the same order as the posts and consumed post by post
+            meta_rows = conn.get_posts_meta(uncached_post_ids, stream=True)
+
+        meta = next(meta_rows, None) if meta_rows is not None else None
+        for post in posts:
+
+            run = cached_runs.get(post.get("id"))
+            if run is not None:
+                parsed_post_ids.append(run.id)
+                yield run, True
+                continue
+
+            post_attr = dict()
+            while meta is not None and meta.post_id >= post.get("id"):
+                if meta.post_id == post.get("id") and len(str(meta.meta_value)) != 0:
+                    post_attr[meta.meta_key] = meta.meta_value
+                meta = next(meta_rows, None)
+
+            run = parse_hash_run(post, post_attr, event_manager_form_fields,
+                                 fields if lazy_content is True else None)
+
+            if run is None:
+                # post might have been parsed successfully before it got modified
+                if store is not None:
+                    store.discard(post.get("id"))
+                continue
+
+            # runs without description are incomplete
+            if store is not None and lazy_content is False:
+                store.set(run, post.get("post_modified"))
+
+            parsed_post_ids.append(run.id)
+            yield run, False
+
+        # release DB session before the next page is queried
+        if meta_rows is not None:
+            meta_rows.close()
+
+        if page_size is None or len(posts) < page_size:
+            break
 
-        if event_time_zone is None and config.app_settings.timezone_string is not None:
-            event_time_zone = config.app_settings.timezone_string
+        page_size = min(page_size * 2, conn.posts_page_size)
 
-        # add timezone information to timestamp
-        if event_time_zone is not None:
+    if store is not None and complete is True:
+        store.track_post_ids(all_post_ids, complete=True)
+
+    # all events have been parsed, following requests can be served without querying the DB
+    if store is not None and complete is True and lazy_content is False:
+        store.set_snapshot(parsed_post_ids)
+
+
+def fetch_hash_run_descriptions(runs: List[Hash]) -> None:
+    """
+        fetch the description of runs which have been parsed without post content with a single query
+    """
 
-            if isinstance(run.start_date, datetime):
-                run.start_date = event_time_zone.localize(run.start_date)
+    if len(runs) == 0:
+        return
 
-            if isinstance(run.end_date, datetime):
-                run.end_date = event_time_zone.localize(run.end_date)
+    post_content = get_db_handler().get_posts_content([x.id for x in runs])
 
-        if config.app_settings.timezone_string is not None:
-            if isinstance(run.last_update, datetime):
-                run.last_update = config.app_settings.timezone_string.localize(run.last_update)
+    for run in runs:
+        content = post_content.get(run.id)
+        run.event_description = content if isinstance(content, str) and len(content.strip()) > 0 else None
+
+
+def get_hash_runs(params: HashParams, post_ids: List[int] = None, fields: List[str] = None,
+                  explain: dict = None) -> List[Hash]:
+    """
+        return list of Hash runs which match the filter params
+
+        Parameters
+        ----------
+        params: HashParams
+            params to filter runs for
+        post_ids: list
+            only fetch runs with these post ids
+        fields: list
+            run attributes which will be returned, all if not set
+        explain: dict
+            gets filled with the query plan which has been used and its timings
+
+        Returns
+        -------
+        list: Hash runs
+    """
+
+    start_time = perf_counter()
+    plan = QueryPlan()
+
+    store = get_event_store()
+
+    runs = None
+    candidates = None
+    geo_matches = None
+    if store is not None:
+
+        # resolve substring, range, flag and category filters of stored events via indexes
+        for matches in [store.search_columns(params), store.search_text(params),
+                        store.search_ranges(params, ["start_date", "run_number"])]:
+            if matches is not None:
+                candidates = matches if candidates is None else candidates & matches
+
+        # resolve distances of stored events via geo index
+        if params.near is not None:
+            geo_matches = store.geo_index.search(*params.near, radius_km=params.radius_km)
+
+        # serve listings from the snapshot of all parsed events if still valid. Posts modified since
+        # the snapshot has been taken would be missing, changes (last update) are always queried.
+        if params.id is None and post_ids is None and not has_last_update_filter(params):
+            snapshot_candidates = candidates
+            if geo_matches is not None:
+                snapshot_candidates = set(geo_matches) if snapshot_candidates is None \
+                    else snapshot_candidates.intersection(geo_matches)
+
+            snapshot_runs = store.get_snapshot(snapshot_candidates)
+            if snapshot_runs is not None:
+                runs = ((run, True) for run in snapshot_runs)
+                plan.strategy = "snapshot"
+
+    # look up candidates of selective filters via meta data instead of fetching all posts
+    candidate_post_ids = None
+    if runs is None and params.id is None and post_ids is None:
+        plan = get_db_handler().plan_posts_query(get_meta_conditions(params))
+        plan.timings["plan"] = perf_counter() - start_time
+
+        if plan.strategy == "meta_first":
+            candidate_post_ids = get_db_handler().get_meta_post_ids(plan.meta_key, plan.meta_values)
+            plan.timings["candidates"] = perf_counter() - start_time - plan.timings["plan"]
+
+    # without event store, post content is only fetched for returned runs. With event store, content is
+    # fetched for all parsed posts, if results are limited only about as many posts as needed get parsed.
+    lazy_content = store is None
+    page_size = None
+    if params.limit is not None and params.q is None and params.near is None:
+        page_size = max(params.limit, 1)
+
+    if runs is None:
+        runs = get_db_hash_runs(params, post_ids, lazy_content=lazy_content,
+                                fields=get_required_fields(params, fields), page_size=page_size,
+                                candidate_post_ids=candidate_post_ids)
+
+    fetch_start_time = perf_counter()
+
+    passes_filter = compile_filter_params(params)
+
+    return_list = list()
+    distances = dict()
+    lazy_post_ids = set()
+    for run, cached in runs:
+
+        # index results are only valid for stored events
+        if cached is True and candidates is not None and run.id not in candidates:
+            continue
 
         # apply filters
-        if passes_filter_params(params, run) is False:
+        if passes_filter(run) is False:
             continue
 
+        # runs without coordinates are excluded from proximity searches
+        if params.near is not None:
+            if geo_matches is not None and cached is True:
+                distance = geo_matches.get(run.id)
+            elif run.geo_lat is not None and run.geo_long is not None:
+                distance = haversine_km(*params.near, run.geo_lat, run.geo_long)
+            else:
+                distance = None
+
+            if distance is None or (params.radius_km is not None and distance > params.radius_km):
+                continue
+
+            distances[run.id] = distance
+
         return_list.append(run)
+        if lazy_content is True and cached is False:
+            lazy_post_ids.add(run.id)
 
-        if params.limit is not None and len(return_list) >= params.limit:
+        # full text and proximity search results need to be sorted first
+        if params.limit is not None and params.q is None and params.near is None and \
+                len(return_list) >= params.limit:
             break
 
-    log.debug(f"returning '{len(return_list)}' run/event results")
+    # release DB session if not all runs have been consumed
+    runs.close()
+    plan.timings["fetch"] = perf_counter() - fetch_start_time
+
+    if params.q is not None:
+        # full text search needs all descriptions to rank results
+        fetch_hash_run_descriptions([x for x in return_list if x.id in lazy_post_ids])
+        lazy_post_ids = set()
+
+        if store is not None:
+            search_index = store.search_index
+        else:
+            search_index = FullTextIndex()
+            for run in return_list:
+                search_index.add(run.id, EventStore.get_search_fields(run))
+
+        scores = search_index.search(params.q)
+
+        return_list = sorted([x for x in return_list if x.id in scores], key=lambda x: scores[x.id], reverse=True)
+
+    # proximity search results are sorted by distance
+    if params.near is not None:
+        return_list.sort(key=lambda x: distances[x.id])
+
+    if params.limit is not None:
+        return_list = return_list[:params.limit]
+
+    if fields is None or "event_description" in fields:
+        fetch_hash_run_descriptions([x for x in return_list if x.id in lazy_post_ids])
+
+    plan.timings["total"] = perf_counter() - start_time
+
+    log.debug(f"returning '{len(return_list)}' run/event results using query plan '{plan.strategy}'")
+
+    if explain is not None:
+        explain.update(plan.dict())
+        explain["num_results"] = len(return_list)
 
     return return_list
+
+
+def iter_hash_runs(params: HashParams, conn: DBConnection = None) -> Iterator[Hash]:
+    """
+        yield all Hash runs matching the 'id' and 'last_update' filters of 'params' without collecting them.
+        All other filters are ignored. Runs are served from the event store snapshot if still valid and
+        no 'last_update' filter is set.
+
+        Parameters
+        ----------
+        params: HashParams
+            params to filter runs for
+        conn: DBConnection
+            DB connection to use instead of the shared one
+
+        Returns
+        -------
+        generator: Hash runs
+    """
+
+    store = get_event_store()
+    if store is not None and params.id is None and not has_last_update_filter(params):
+        runs = store.get_snapshot()
+        if runs is not None:
+            yield from runs
+            return
+
+    for run, _ in get_db_hash_runs(params, conn=conn):
+        yield run
+
+
+def get_next_hash_run(kennel_name: str = None) -> Union[Hash, None]:
+    """
+        return the next upcoming Hash run which is not deleted or hidden
+
+        Parameters
+        ----------
+        kennel_name: str
+            only return runs of this kennel
+
+        Returns
+        -------
+        Hash: the next Hash run, None if no upcoming run was found
+    """
+
+    store = get_event_store()
+    if store is not None and store.snapshot_valid() is True:
+        return store.get_next_run(kennel_name)
+
+    # noinspection PyArgumentList
+    runs = get_hash_runs(HashParams(start_date__gt=int(datetime.now(tz=pytz.utc).timestamp())))
+
+    # a complete listing of all posts has been parsed, the event store is able to answer from now on
+    if store is not None and store.snapshot_valid() is True:
+        return store.get_next_run(kennel_name)
+
+    runs = [x for x in runs if x.deleted is False and x.event_hidden is False and
+            (kennel_name is None or str(x.kennel_name).lower() == kennel_name.lower())]
+
+    return min(runs, key=lambda x: x.start_date, default=None)
+
+
+def get_hash_run_stats(num_hares: int = None) -> HashStats:
+    """
+        return statistics of all Hash runs. The event store maintains these with every stored event,
+        only if not all runs are stored they get fetched once.
+
+        Parameters
+        ----------
+        num_hares: int
+            number of most frequent hares to return
+
+        Returns
+        -------
+        HashStats: run statistics
+    """
+
+    store = get_event_store()
+    if store is not None and store.snapshot_valid() is True:
+        return store.stats.get_stats(num_hares)
+
+    # noinspection PyArgumentList
+    runs = get_hash_runs(HashParams(), fields=RunStatistics.fields)
+
+    if store is not None and store.snapshot_valid() is True:
+        return store.stats.get_stats(num_hares)
+
+    stats = RunStatistics()
+    for run in runs:
+        stats.add(run)
+
+    return stats.get_stats(num_hares)
 # EOF
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class CacheInvalidationResult(BaseModel):
+    """
+        result of a cache invalidation request
+    """
+    post_id: Optional[int] = Field(None, description="id of the invalidated event, empty if all events got invalidated")
+    events_evicted: int = Field(0, description="number of events evicted from the event cache")
+
+# EOF
@@ -64,6 +64,11 @@ class HashParams:
     run_is_counted: Optional[bool] = None
     hares: Optional[str] = None
     location_name: Optional[str] = None
+    near: Optional[str] = Query(None, description="comma separated latitude and longitude, only runs with "
+                                                  "coordinates are returned and sorted by distance")
+    radius_km: Optional[float] = Query(None, description="only return runs within this distance of 'near'")
+    q: Optional[str] = Query(None, description="full text search in all text fields including the description, "
+                                               "results are ranked by relevance")
     limit: Optional[int] = None
 
     def dict(self):
@@ -104,6 +109,29 @@ class HashParams:
                                                      msg=f"parma '{key}' {e}: {value}",
                                                      typ="value_error")
 
+        # parse geo coordinates
+        if values.get("near") is not None:
+            try:
+                lat, long = [float(x) for x in values.get("near").split(",")]
+                if not -90 <= lat <= 90 or not -180 <= long <= 180:
+                    raise ValueError("coordinates out of range")
+            except ValueError as e:
+                raise RequestValidationError(loc=["query", "near"],
+                                             msg=f"param 'near' must be 'latitude,longitude' ({e}): "
+                                                 f"{values.get('near')}",
+                                             typ="value_error")
+            values["near"] = (lat, long)
+
+        if values.get("radius_km") is not None:
+            if values.get("near") is None:
+                raise RequestValidationError(loc=["query", "radius_km"],
+                                             msg="param 'radius_km' can only be used together with 'near'",
+                                             typ="value_error")
+            if values.get("radius_km") <= 0:
+                raise RequestValidationError(loc=["query", "radius_km"],
+                                             msg="param 'radius_km' must be greater than 0",
+                                             typ="value_error")
+
         # check valid run attributes
         wrong_event_attributes = list()
         valid_event_attributes = [e.value for e in HashAttributes]
@@ -125,6 +153,13 @@ class HashParams:
         return values
 
 
+class HashMapUrl(BaseModel):
+    """
+        used to validate a map url without failing the whole run/event
+    """
+    url: AnyHttpUrl
+
+
 # noinspection PyMethodParameters
 class Hash(BaseModel):
     """
@@ -180,17 +215,92 @@ class Hash(BaseModel):
 
     @validator("geo_map_url", always=True, pre=True)
     def loose_type_geo_map_url(cls, value):
-        class SelfValidate(BaseModel):
-            url: AnyHttpUrl
-
         if value is None:
             return
         try:
-            SelfValidate(url=value)
+            HashMapUrl(url=value)
         except ValidationError as e:
             log.warning(f"Issues while validating 'geo_map_url' value '{value}': {e.errors()[0].get('msg')}")
             return
 
         return value
 
+
+@dataclass
+class HashBatchParams:
+    """
+        defines a list of run/event ids to fetch at once
+    """
+    ids: List[int] = Field(description="list of run ids", max_items=500)
+
+
+class HashBatchItem(BaseModel):
+    """
+        result of a single requested run/event id, 'run' is empty if run has not been found
+    """
+    id: int
+    found: bool
+    run: Optional[Hash] = None
+
+    class Config:
+        json_encoders = {
+            # custom output conversion for datetime
+            datetime: lambda x: x.isoformat()
+        }
+
+
+class HashTombstoneReason(str, Enum):
+    """
+        reason why a run/event has been removed from the list of active runs
+    """
+    deleted = "deleted"
+    purged = "purged"
+
+
+class HashTombstone(BaseModel):
+    """
+        marks a run/event as removed
+    """
+    id: int
+    reason: HashTombstoneReason = Field(description="'deleted' if run got trashed, unpublished or cancelled, "
+                                                    "'purged' if run got permanently deleted from WordPress")
+    last_update: datetime = Field(description="in ISO format")
+
+    class Config:
+        json_encoders = {
+            # custom output conversion for datetime
+            datetime: lambda x: x.isoformat()
+        }
+
+
+class HashChanges(BaseModel):
+    """
+        runs/events which changed since a defined cursor
+    """
+    cursor: int = Field(description="pass as 'since' param to the next request to receive only newer changes")
+    changes: List[Hash] = Field(description="runs/events which have been added or updated")
+    tombstones: List[HashTombstone] = Field(description="runs/events which have been removed")
+
+
+class HashExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+class HashStatsCount(BaseModel):
+    name: str
+    count: int
+
+
+class HashStats(BaseModel):
+    """
+        statistics of all runs/events which are not deleted
+    """
+    num_runs: int = Field(description="number of runs")
+    runs_per_year: Dict[int, int] = Field(description="number of runs by year of start date")
+    runs_per_kennel: Dict[str, int] = Field(description="number of runs by kennel name")
+    runs_per_type: Dict[str, int] = Field(description="number of runs by event type")
+    event_attributes: Dict[str, int] = Field(description="number of runs by event attribute")
+    hares: List[HashStatsCount] = Field(description="most frequent hares")
+
 # EOF
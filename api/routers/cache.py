@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from typing import Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends
+
+from api.security import api_key_valid
+from api.models.cache import CacheInvalidationResult
+from api.models.exceptions import APITokenValidationFailed
+from api.models.run import HashParams
+from api.factory.runs import get_hash_runs, get_hash_run
+from source.event_store import get_event_store
+from common.log import get_logger
+
+log = get_logger()
+
+router_cache = APIRouter(
+    prefix="/cache",
+    tags=["cache"]
+)
+
+
+async def refresh_runs(post_id: int = None) -> None:
+    """
+        refresh events as coroutine. This way it runs within the event loop and not in
+        a separate thread, which would share the DB connection with the request handlers.
+    """
+    if post_id is not None:
+        get_hash_run(post_id)
+    else:
+        # noinspection PyArgumentList
+        get_hash_runs(HashParams())
+
+
+@router_cache.post("/invalidate", response_model=CacheInvalidationResult, summary="Invalidate cached runs",
+                   description="Evicts a single run or all runs from the cache and refreshes them")
+async def invalidate_cache(background_tasks: BackgroundTasks, post_id: Optional[int] = None,
+                           key_valid: bool = Depends(api_key_valid)):
+    """
+        To be called by WordPress (i.e. via 'save_post' hook) whenever an event got changed
+
+        - **post_id**: The integer id of the changed run, if omitted all runs will be invalidated
+    """
+
+    if key_valid is False:
+        raise APITokenValidationFailed
+
+    store = get_event_store()
+
+    if store is None:
+        return CacheInvalidationResult(post_id=post_id)
+
+    if post_id is not None:
+        log.info(f"Invalidating cache for event id '{post_id}'")
+    else:
+        log.info("Invalidating cache for all events")
+
+    num_evicted = store.evict(post_id)
+
+    # refresh evicted events in the background
+    background_tasks.add_task(refresh_runs, post_id)
+
+    return CacheInvalidationResult(post_id=post_id, events_evicted=num_evicted)
+
+# EOF
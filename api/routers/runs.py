@@ -7,10 +7,11 @@
 #  For a copy, see file LICENSE.txt included in this
 #  repository or visit: <https://opensource.org/licenses/MIT>.
 
-from typing import List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Depends, Query, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from datetime import datetime, timedelta
 from icalendar import Calendar, Event, vText, Alarm, vGeo
 from pytz import utc
@@ -18,11 +19,15 @@ from bs4 import BeautifulSoup
 import re
 
 from api.security import api_key_valid
-from api.models.run import Hash, HashParams
-from api.models.exceptions import APITokenValidationFailed
-from api.factory.runs import get_hash_runs
+from api.models.run import Hash, HashParams, HashChanges, HashTombstone, HashTombstoneReason, HashBatchParams, \
+    HashBatchItem, HashStats, HashExportFormat
+from api.models.exceptions import APITokenValidationFailed, RequestValidationError
+from api.factory.runs import get_hash_runs, get_hash_run, get_next_hash_run, get_hash_run_stats
+from api.factory.export import export_hash_runs
+from api.stream import get_broadcaster
 from config.api import BasicAPISettings
-from common.misc import format_slug
+from common.misc import format_slug, dump_json
+from source.event_store import get_event_store, EventStore
 import config
 
 router_runs = APIRouter(
@@ -31,20 +36,143 @@ router_runs = APIRouter(
 )
 
 
+def json_response(content: Any) -> JSONResponse:
+    """
+        runs are validated once when they get parsed. Returning a response directly skips
+        validating them again against the response model.
+    """
+    return JSONResponse(content=jsonable_encoder(content))
+
+
+def get_run_json(run: Hash, store: EventStore = None, fields: List[str] = None) -> bytes:
+    """
+        return run serialized as JSON. The serialized run is kept in the event store and reused
+        as long as the run has not been updated. If 'fields' is set, only these attributes get
+        serialized and the result is not kept.
+    """
+
+    if fields is not None:
+        return dump_json(jsonable_encoder(run, include=set(fields)))
+
+    if store is not None:
+        return store.get_fragment(run)
+
+    return dump_json(run)
+
+
+def get_runs_json(runs: List[Hash], store: EventStore = None, fields: List[str] = None) -> bytes:
+    return b"[" + b",".join([get_run_json(x, store, fields) for x in runs]) + b"]"
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+        validate comma separated list of run attributes, returned in order of the Hash model
+    """
+
+    if fields is None:
+        return
+
+    requested_fields = [x.strip() for x in fields.split(",") if len(x.strip()) > 0]
+
+    wrong_fields = [x for x in requested_fields if x not in Hash.__fields__]
+    if len(wrong_fields) > 0:
+        raise RequestValidationError(loc=["query", "fields"],
+                                     msg=f"param 'fields' contains invalid run attributes: {', '.join(wrong_fields)}",
+                                     typ="value_error")
+
+    return [x for x in Hash.__fields__ if x in requested_fields]
+
+
+def get_runs_by_id(post_ids: List[int]) -> List[HashBatchItem]:
+    """
+        fetch all requested runs at once and return them in requested order
+    """
+
+    # skip ids which are known to not exist
+    store = get_event_store()
+    query_post_ids = list({x for x in post_ids if store is None or store.is_missing(x) is False})
+
+    runs = dict()
+    if len(query_post_ids) > 0:
+        # noinspection PyArgumentList
+        runs = {run.id: run for run in get_hash_runs(HashParams(), post_ids=query_post_ids)}
+
+    return [HashBatchItem(id=x, found=x in runs, run=runs.get(x)) for x in post_ids]
+
+
+@router_runs.get("", response_model=List[HashBatchItem], summary="List of requested runs",
+                 description="Returns the requested Hash runs in requested order. "
+                             "Runs which don't exist are marked as not found")
+async def get_runs_by_ids(ids: str = Query(..., description="comma separated list of run ids (max 500)"),
+                          key_valid: bool = Depends(api_key_valid)):
+
+    if key_valid is False:
+        raise APITokenValidationFailed
+
+    try:
+        post_ids = [int(x) for x in ids.split(",") if len(x.strip()) > 0]
+    except ValueError:
+        raise RequestValidationError(loc=["query", "ids"], msg=f"param 'ids' must be a comma separated list of "
+                                                               f"integers: {ids}", typ="value_error")
+
+    if len(post_ids) > 500:
+        raise RequestValidationError(loc=["query", "ids"], msg="param 'ids' must not contain more than 500 ids",
+                                     typ="value_error")
+
+    return json_response(get_runs_by_id(post_ids))
+
+
+@router_runs.post("/batch", response_model=List[HashBatchItem], summary="List of requested runs",
+                  description="Returns the requested Hash runs in requested order. "
+                              "Runs which don't exist are marked as not found")
+async def get_runs_batch(params: HashBatchParams, key_valid: bool = Depends(api_key_valid)):
+
+    if key_valid is False:
+        raise APITokenValidationFailed
+
+    return json_response(get_runs_by_id(params.ids))
+
+
 @router_runs.get("/all", response_model=List[Hash], summary="List of runs", description="Returns all Hash runs")
-async def get_runs(params: HashParams = Depends(HashParams), key_valid: bool = Depends(api_key_valid)):
+async def get_runs(params: HashParams = Depends(HashParams),
+                   fields: Optional[str] = Query(None, description="comma separated list of run attributes to "
+                                                                   "return, all attributes if not set"),
+                   explain: bool = Query(False, description="return the query plan and its timings instead "
+                                                            "of the runs"),
+                   key_valid: bool = Depends(api_key_valid)):
 
     if key_valid is False:
         raise APITokenValidationFailed
 
-    result = get_hash_runs(params)
+    fields = parse_fields(fields)
+
+    # query plans are only meaningful for requests which are not answered from cache
+    if explain is True:
+        query_plan = dict()
+        get_hash_runs(params, fields=fields, explain=query_plan)
+        return json_response(query_plan)
+
+    store = get_event_store()
+    cache_key = tuple(params.dict().items()) + (("fields", tuple(fields or list())),)
+
+    if store is not None:
+        content = store.responses.get(cache_key)
+        if content is not None:
+            return Response(content=content, media_type="application/json")
+
+    result = get_hash_runs(params, fields=fields)
 
     """
     if error is not None:
         raise HTTPException(status_code=400, detail=error)
     """
 
-    return result
+    content = get_runs_json(result, store, fields)
+
+    if store is not None:
+        store.responses.set(cache_key, content)
+
+    return Response(content=content, media_type="application/json")
 
 
 @router_runs.get("/calendar", summary="List of runs as iCal events", description="Returns Hash runs as iCal events",
@@ -108,12 +236,21 @@ async def get_runs_as_icalendar(params: HashParams = Depends(HashParams), key_va
     cal.add('CALSCALE', 'GREGORIAN')
     cal.add('METHOD', 'PUBLISH')
 
+    store = get_event_store()
+
     for run in get_hash_runs(params) or list():
 
         # hide runs which are deleted or meant to not show up
         if run.deleted or run.event_hidden:
             continue
 
+        # reuse already rendered event if run has not been updated since
+        if store is not None:
+            last_update, event = store.icalendar.get(run.id, (None, None))
+            if event is not None and last_update == run.last_update:
+                cal.add_component(event)
+                continue
+
         if run.end_date is None:
             run.end_date = run.start_date + timedelta(hours=2)
 
@@ -156,6 +293,9 @@ async def get_runs_as_icalendar(params: HashParams = Depends(HashParams), key_va
 
             event.add_component(alarm)
 
+        if store is not None:
+            store.icalendar.set(run.id, (run.last_update, event))
+
         cal.add_component(event)
 
     return Response(content=cal.to_ical(),
@@ -164,28 +304,156 @@ async def get_runs_as_icalendar(params: HashParams = Depends(HashParams), key_va
                              f"attachment; filename={format_slug(config.calendar_settings.name)}.ics"})
 
 
+@router_runs.get("/changes", response_model=HashChanges, summary="List of changed runs",
+                 description="Returns all Hash runs which changed since the passed cursor. Runs which have "
+                             "been trashed, unpublished, cancelled or permanently deleted are returned as "
+                             "tombstones. Permanently deleted runs are only tracked since the API has been started.")
+async def get_run_changes(since: int = Query(..., description="cursor returned by the previous request, "
+                                                              "set as unix timestamp (0 for all runs)"),
+                          key_valid: bool = Depends(api_key_valid)):
+
+    if key_valid is False:
+        raise APITokenValidationFailed
+
+    # the next cursor overlaps with this request by a second. This way no changes get lost
+    # which happened within the same second but consumers may receive some changes twice.
+    cursor = int(datetime.now(tz=utc).timestamp()) - 1
+
+    # noinspection PyArgumentList
+    params = HashParams(last_update__gt=since)
+
+    changes = list()
+    tombstones = list()
+    for run in get_hash_runs(params):
+        if run.deleted is True:
+            tombstones.append(HashTombstone(id=run.id, reason=HashTombstoneReason.deleted,
+                                            last_update=run.last_update))
+        else:
+            changes.append(run)
+
+    store = get_event_store()
+    if store is not None:
+        for post_id, purged in store.get_purged_post_ids(since=params.last_update__gt).items():
+            tombstones.append(HashTombstone(id=post_id, reason=HashTombstoneReason.purged, last_update=purged))
+
+    return json_response(HashChanges(cursor=cursor, changes=changes, tombstones=tombstones))
+
+
+# noinspection PyShadowingBuiltins
+@router_runs.get("/export", summary="Export of all runs",
+                 description="Returns all Hash runs including deleted ones as gzip compressed CSV or "
+                             "newline delimited JSON (one run per line). The export is streamed.",
+                 responses={200: {"content": {"application/gzip": {}}}},
+                 response_class=StreamingResponse)
+async def export_runs(format: HashExportFormat = Query(HashExportFormat.ndjson, description="export format"),
+                      since: Optional[int] = Query(None, description="only export runs updated since, "
+                                                                     "set as unix timestamp"),
+                      key_valid: bool = Depends(api_key_valid)):
+
+    if key_valid is False:
+        raise APITokenValidationFailed
+
+    # chunks are generated on the event loop, same as all other DB queries
+    async def stream():
+        for chunk in export_hash_runs(format, since):
+            yield chunk
+
+    return StreamingResponse(stream(), media_type="application/gzip",
+                             headers={"content-disposition": f"attachment; filename=runs.{format.value}.gz"})
+
+
+@router_runs.get("/stream", summary="Stream of run updates",
+                 description="Server-Sent Events stream which pushes an event for each new (insert), "
+                             "changed (update) and permanently deleted (purge) run. A comment is sent "
+                             "as heartbeat. Pass the 'Last-Event-ID' header to resume a stream. If the "
+                             "stream can't be resumed a 'reset' event is sent and all runs should be synced.",
+                 responses={200: {"content": {"text/event-stream": {}}}},
+                 response_class=StreamingResponse)
+async def get_run_stream(last_event_id: Optional[str] = Header(None), key_valid: bool = Depends(api_key_valid)):
+
+    if key_valid is False:
+        raise APITokenValidationFailed
+
+    broadcaster = get_broadcaster()
+
+    if broadcaster is None:
+        raise HTTPException(status_code=503, detail="Run stream is only available if caching is enabled")
+
+    return StreamingResponse(broadcaster.stream(last_event_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router_runs.get("/next", response_model=Hash, summary="Returns the next upcoming Hash run",
+                 description="Returns the next upcoming Hash run which is not deleted or hidden")
+async def get_next_run(kennel: Optional[str] = Query(None, description="only return the next run of this kennel"),
+                       key_valid: bool = Depends(api_key_valid)):
+
+    if key_valid is False:
+        raise APITokenValidationFailed
+
+    if kennel is not None and kennel.lower() not in [x.lower() for x in config.app_settings.hash_kennels]:
+        kennels = ", ".join(config.app_settings.hash_kennels)
+        raise RequestValidationError(loc=["query", "kennel"], msg=f"param 'kennel' must be one of: {kennels}",
+                                     typ="value_error")
+
+    result = get_next_hash_run(kennel)
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="No upcoming run found")
+
+    return Response(content=get_run_json(result, get_event_store()), media_type="application/json")
+
+
+@router_runs.get("/stats", response_model=HashStats, summary="Run statistics",
+                 description="Returns statistics of all Hash runs which are not deleted")
+async def get_run_stats(num_hares: int = Query(20, ge=0, description="number of most frequent hares to return"),
+                        key_valid: bool = Depends(api_key_valid)):
+
+    if key_valid is False:
+        raise APITokenValidationFailed
+
+    return get_hash_run_stats(num_hares)
+
+
 # noinspection PyShadowingBuiltins
 @router_runs.get("/{id}", response_model=Hash, summary="Returns a single Hash run")
-async def get_run(id: int, key_valid: bool = Depends(api_key_valid)):
+async def get_run(id: int,
+                  fields: Optional[str] = Query(None, description="comma separated list of run attributes to "
+                                                                  "return, all attributes if not set"),
+                  key_valid: bool = Depends(api_key_valid)):
     """
         To view all details related to a single run
 
         - **id**: The integer id of the desired run
+        - **fields**: comma separated list of run attributes to return
     """
 
     if key_valid is False:
         raise APITokenValidationFailed
 
-    # noinspection PyArgumentList
-    result = get_hash_runs(HashParams(id=id))
+    fields = parse_fields(fields)
 
-    """
-    if error is not None:
-        raise HTTPException(status_code=400, detail=error)
-    """
-    if result is None or len(result) == 0:
+    store = get_event_store()
+    cache_key = ("id", id) if fields is None else ("id", id, tuple(fields))
+
+    if store is not None:
+        content = store.responses.get(cache_key)
+        if content is not None:
+            return Response(content=content, media_type="application/json")
+
+        if store.is_missing(id) is True:
+            raise HTTPException(status_code=404, detail="Run not found")
+
+    result = get_hash_run(id, fields)
+
+    if result is None:
         raise HTTPException(status_code=404, detail="Run not found")
 
-    return result[0]
+    content = get_run_json(result, store, fields)
+
+    if store is not None:
+        store.responses.set(cache_key, content)
+
+    return Response(content=content, media_type="application/json")
 
 # EOF
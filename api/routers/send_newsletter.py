@@ -11,10 +11,9 @@ import hashlib
 from fastapi import APIRouter, HTTPException
 from time import time
 
-from api.models.run import HashParams
 from api.models.send_newsletter import SendNewsletterParams, ListmonkReturnDataList
 from api.models.exceptions import CredentialsInvalid
-from api.factory.runs import get_hash_runs
+from api.factory.runs import get_hash_run
 from source.database import get_db_handler
 from common.misc import php_deserialize, grab
 from common.log import get_logger
@@ -81,14 +80,11 @@ async def get_run(post_id: int, params: SendNewsletterParams):
     # all checks passed and user presented a valid session
 
     # fetch post
-    # noinspection PyArgumentList
-    result = get_hash_runs(HashParams(id=post_id))
+    event = get_hash_run(post_id)
 
-    if result is None or len(result) == 0:
+    if event is None:
         raise HTTPException(status_code=404, detail="Run not found")
 
-    event = result[0]
-
     # fetch template from listmonk
     listmonk_handler = get_listmonk_handler()
     listmonk_template = listmonk_handler.get_template(listmonk_handler.config.body_template_id)
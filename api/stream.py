@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+import asyncio
+import json
+from collections import deque
+from time import time
+from typing import AsyncIterator, Set, Union
+
+from api.factory.runs import get_hash_runs
+from api.models.run import HashParams
+from common.log import get_logger
+from source.database import get_db_handler
+from source.event_store import EventStore
+
+log = get_logger()
+broadcaster = None
+
+
+class RunEventBroadcaster:
+    """
+        publishes changes of the event store as Server-Sent Events to all connected stream clients.
+
+        Evictions (cache invalidation or binlog) trigger a debounced sync of the evicted events. The sync
+        only parses changed posts and the event store then notifies about new, updated and purged runs.
+        A sync of all events (startup or eviction of all events) runs page by page and yields to the event
+        loop in between, so requests are not blocked for the whole sync.
+
+        Clients which don't read their messages fast enough get their queue replaced by a 'reset' event.
+    """
+
+    heartbeat_interval = 15
+    history_size = 1000
+    client_queue_size = 100
+    sync_delay = 1
+    sync_page_size = 100
+
+    def __init__(self, store: EventStore, loop: asyncio.AbstractEventLoop) -> None:
+
+        global broadcaster
+
+        self.store = store
+        self.loop = loop
+
+        # event ids are prefixed with start time of this process to detect ids of previous processes
+        self.epoch = int(time())
+        self.last_event_id = 0
+        self.history = deque(maxlen=self.history_size)
+        self.clients: Set[asyncio.Queue] = set()
+        self.sync_pending = False
+        self.sync_post_ids: Set[int] = set()
+        self.sync_all = False
+
+        # initial sync, afterwards every new event is reported as new run
+        self.sync_all = True
+        self.schedule_sync(delay=0)
+
+        self.store.subscribe(self.on_store_change)
+
+        broadcaster = self
+
+    def on_store_change(self, action: str, post_id: Union[int, None] = None) -> None:
+        # store changes might be reported from other threads (binlog consumer)
+        self.loop.call_soon_threadsafe(self.handle_store_change, action, post_id)
+
+    def handle_store_change(self, action: str, post_id: Union[int, None] = None) -> None:
+
+        if action == "evict":
+            if post_id is None:
+                self.sync_all = True
+            else:
+                self.sync_post_ids.add(post_id)
+            self.schedule_sync()
+            return
+
+        data = {"id": post_id}
+        if action in ["insert", "update"]:
+            run = self.store.get(post_id)
+            if run is None:
+                return
+
+            data = json.loads(run.json(include={"id", "event_name", "kennel_name", "run_number",
+                                                "start_date", "last_update", "deleted", "event_hidden"}))
+
+        self.publish(action, data)
+
+    def schedule_sync(self, delay: float = None) -> None:
+
+        if self.sync_pending is True:
+            return
+
+        self.sync_pending = True
+        self.loop.call_later(self.sync_delay if delay is None else delay,
+                             lambda: self.loop.create_task(self.sync()))
+
+    async def sync(self) -> None:
+        """
+            parse evicted events again. Runs as coroutine within the event loop as the
+            DB connection and event store are shared with the request handlers.
+        """
+
+        sync_all = self.sync_all
+        post_ids = sorted(self.sync_post_ids)
+
+        self.sync_pending = False
+        self.sync_all = False
+        self.sync_post_ids.clear()
+
+        if sync_all is True:
+            await self.sync_all_runs()
+            return
+
+        log.debug(f"Syncing '{len(post_ids)}' evicted event%s" % ("s" if len(post_ids) != 1 else ""))
+
+        for i in range(0, len(post_ids), self.sync_page_size):
+            # noinspection PyArgumentList
+            get_hash_runs(HashParams(), post_ids=post_ids[i:i + self.sync_page_size])
+            await asyncio.sleep(0)
+
+    async def sync_all_runs(self) -> None:
+
+        log.debug("Syncing all events of event store")
+
+        conn = get_db_handler()
+        all_post_ids = list()
+        before_id = None
+        while True:
+            posts = conn.get_posts(limit=self.sync_page_size, before_id=before_id, with_content=False)
+            if len(posts) == 0:
+                break
+
+            post_ids = [x.get("id") for x in posts]
+            # noinspection PyArgumentList
+            get_hash_runs(HashParams(), post_ids=post_ids)
+            all_post_ids.extend(post_ids)
+            before_id = post_ids[-1]
+
+            await asyncio.sleep(0)
+
+        # detect events purged from WordPress
+        self.store.track_post_ids(all_post_ids, complete=True)
+
+    def publish(self, action: str, data: dict) -> None:
+
+        self.last_event_id += 1
+
+        message = f"id: {self.epoch}-{self.last_event_id}\nevent: {action}\ndata: {json.dumps(data)}\n\n"
+
+        self.history.append((self.last_event_id, message))
+
+        for client in self.clients:
+            try:
+                client.put_nowait(message)
+            except asyncio.QueueFull:
+                # client is too slow, drop pending messages and let it sync all runs
+                while not client.empty():
+                    client.get_nowait()
+                client.put_nowait(self.reset_message())
+
+    def reset_message(self) -> str:
+
+        return f"id: {self.epoch}-{self.last_event_id}\nevent: reset\ndata: {{}}\n\n"
+
+    def parse_event_id(self, event_id: str = None) -> Union[int, None]:
+        """
+            return the event counter of an event id of this process, None if id is unknown
+        """
+
+        # noinspection PyBroadException
+        try:
+            epoch, counter = event_id.split("-")
+            if int(epoch) == self.epoch and int(counter) <= self.last_event_id:
+                return int(counter)
+        except Exception:
+            pass
+
+    async def stream(self, last_event_id: str = None) -> AsyncIterator[str]:
+        """
+            yields Server-Sent Events messages, starts with missed messages if 'last_event_id' is defined
+        """
+
+        client = asyncio.Queue(maxsize=self.client_queue_size)
+        self.clients.add(client)
+
+        try:
+            if last_event_id is not None:
+                resume_from = self.parse_event_id(last_event_id)
+
+                # unknown id or history does not reach back far enough, client needs to sync all runs
+                if resume_from is None or (len(self.history) > 0 and self.history[0][0] > resume_from + 1):
+                    yield self.reset_message()
+                else:
+                    for event_id, message in list(self.history):
+                        if event_id > resume_from:
+                            yield message
+
+            while True:
+                try:
+                    yield await asyncio.wait_for(client.get(), timeout=self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+        finally:
+            self.clients.discard(client)
+
+
+def get_broadcaster() -> Union[RunEventBroadcaster, None]:
+    global broadcaster
+    return broadcaster
+
+# EOF
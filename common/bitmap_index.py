@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from typing import Any, Callable, Dict, Hashable, List, Set, Tuple, Union
+
+
+class BitmapIndex:
+    """
+        columnar index of low cardinality values. Each document gets a row and every column value
+        holds a bitmask (arbitrary length int) of all rows with this value. Filters are evaluated
+        as bitwise operations on whole masks and only matching rows get decoded to document ids.
+    """
+
+    def __init__(self) -> None:
+        self.rows: Dict[Hashable, int] = dict()
+        self.row_ids: List[Union[Hashable, None]] = list()
+        self.free_rows: List[int] = list()
+        self.columns: Dict[str, Dict[Hashable, int]] = dict()
+        self.documents: Dict[Hashable, List[Tuple[str, Hashable]]] = dict()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, doc_id: Hashable, columns: Dict[str, Any]) -> None:
+        """
+            add document with a value per column, list values set multiple values of a column
+        """
+
+        self.remove(doc_id)
+
+        row = self.free_rows.pop() if len(self.free_rows) > 0 else len(self.row_ids)
+        if row == len(self.row_ids):
+            self.row_ids.append(doc_id)
+        else:
+            self.row_ids[row] = doc_id
+
+        self.rows[doc_id] = row
+
+        values = list()
+        for column, value in columns.items():
+            for column_value in value if isinstance(value, list) else [value]:
+                column_masks = self.columns.setdefault(column, dict())
+                column_masks[column_value] = column_masks.get(column_value, 0) | (1 << row)
+                values.append((column, column_value))
+
+        self.documents[doc_id] = values
+
+    def remove(self, doc_id: Hashable) -> None:
+
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return
+
+        for column, value in self.documents.pop(doc_id):
+            column_masks = self.columns[column]
+            column_masks[value] &= ~(1 << row)
+            if column_masks[value] == 0:
+                del column_masks[value]
+
+        self.row_ids[row] = None
+        self.free_rows.append(row)
+
+    def mask(self, column: str, value: Hashable) -> int:
+        """
+            return mask of all rows with this column value
+        """
+        return self.columns.get(column, dict()).get(value, 0)
+
+    def match(self, column: str, predicate: Callable[[Any], bool]) -> int:
+        """
+            return mask of all rows with a column value matching the predicate
+        """
+
+        mask = 0
+        for value, value_mask in self.columns.get(column, dict()).items():
+            if predicate(value) is True:
+                mask |= value_mask
+
+        return mask
+
+    def decode(self, mask: int) -> Set[Hashable]:
+        """
+            return ids of all documents in mask
+        """
+
+        doc_ids = set()
+        for byte_index, byte in enumerate(mask.to_bytes((mask.bit_length() + 7) // 8, "little")):
+            if byte == 0:
+                continue
+            for bit in range(8):
+                if byte >> bit & 1:
+                    doc_ids.add(self.row_ids[byte_index * 8 + bit])
+
+        return doc_ids
+
+# EOF
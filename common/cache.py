@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Hashable, Tuple
+
+
+class TTLCache:
+    """
+        simple in memory key/value cache which expires entries after a defined time to live (seconds)
+        a ttl of 0 disables the cache. If 'max_size' is set, the least recently used entries are
+        evicted once the cache is full. Expired entries are swept periodically while entries are added.
+    """
+
+    def __init__(self, ttl: int = 300, max_size: int = None) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.data: Dict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self.next_sweep = monotonic() + ttl
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: Hashable, fallback: Any = None) -> Any:
+
+        entry = self.data.get(key)
+        if entry is None:
+            return fallback
+
+        expires, value = entry
+        if expires < monotonic():
+            self.data.pop(key, None)
+            return fallback
+
+        if self.max_size is not None:
+            self.data.move_to_end(key)
+
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: int = None) -> None:
+        """
+            add entry to cache, 'ttl' overrides the default time to live of the cache for this entry
+        """
+
+        if self.ttl <= 0:
+            return
+
+        now = monotonic()
+        if now >= self.next_sweep:
+            self.sweep()
+
+        self.data[key] = (now + (ttl or self.ttl), value)
+        self.data.move_to_end(key)
+
+        if self.max_size is not None:
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def sweep(self) -> int:
+        """
+            remove all expired entries, returns number of removed entries
+        """
+
+        now = monotonic()
+        expired = [key for key, (expires, _) in self.data.items() if expires < now]
+        for key in expired:
+            del self.data[key]
+
+        self.next_sweep = now + self.ttl
+
+        return len(expired)
+
+    def pop(self, key: Hashable) -> bool:
+        return self.data.pop(key, None) is not None
+
+    def clear(self) -> int:
+        num_entries = len(self.data)
+        self.data.clear()
+        return num_entries
+
+# EOF
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from datetime import datetime, tzinfo
+from functools import lru_cache
+from typing import Union
+
+import pytz
+
+# format WordPress and the Event Manager plugin store timestamps in
+date_time_format = "%Y-%m-%d %H:%M:%S"
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name: str) -> tzinfo:
+    """
+    return time zone object by name, each time zone is only looked up once
+
+    Parameters
+    ----------
+    name: str
+        name of the time zone (e.g. Europe/Berlin)
+
+    Returns
+    -------
+    tzinfo: time zone object, raises pytz.UnknownTimeZoneError if time zone is unknown
+    """
+
+    return pytz.timezone(name)
+
+
+def parse_date_time(value: str, time_zone: tzinfo = None) -> Union[datetime, None]:
+    """
+    parse a timestamp in the format 'YYYY-MM-DD HH:MM:SS'. Zero padded values are parsed
+    with the fast ISO format parser, all others fall back to strptime.
+
+    Parameters
+    ----------
+    value: str
+        timestamp string to parse
+    time_zone: tzinfo
+        localize the timestamp to this pytz time zone
+
+    Returns
+    -------
+    datetime: parsed timestamp, None if value could not be parsed
+    """
+
+    if not isinstance(value, str):
+        return
+
+    try:
+        if len(value) == 19 and value[10] == " ":
+            parsed = datetime.fromisoformat(value)
+        else:
+            parsed = datetime.strptime(value, date_time_format)
+    except ValueError:
+        return
+
+    # the ISO format parser also accepts short values with an offset (e.g. '2024-01-01 18:00+01')
+    if parsed.tzinfo is not None:
+        return
+
+    if time_zone is not None:
+        parsed = time_zone.localize(parsed)
+
+    return parsed
+
+# EOF
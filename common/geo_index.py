@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from math import asin, cos, floor, radians, sin, sqrt
+from typing import Dict, Hashable, Set, Tuple
+
+earth_radius_km = 6371.0088
+km_per_degree_latitude = 111.195
+
+
+def haversine_km(lat_a: float, long_a: float, lat_b: float, long_b: float) -> float:
+    """
+    great circle distance between two coordinates
+
+    Parameters
+    ----------
+    lat_a: float
+        latitude of first coordinate
+    long_a: float
+        longitude of first coordinate
+    lat_b: float
+        latitude of second coordinate
+    long_b: float
+        longitude of second coordinate
+
+    Returns
+    -------
+    float: distance in km
+    """
+
+    lat_a, long_a, lat_b, long_b = map(radians, [lat_a, long_a, lat_b, long_b])
+
+    a = sin((lat_b - lat_a) / 2) ** 2 + cos(lat_a) * cos(lat_b) * sin((long_b - long_a) / 2) ** 2
+
+    return 2 * earth_radius_km * asin(min(1.0, sqrt(a)))
+
+
+class GeoGridIndex:
+    """
+        spatial index which sorts coordinates into grid cells of 'cell_size' degrees.
+        A radius search only calculates distances of coordinates in cells touching the search area.
+    """
+
+    cell_size = 0.25
+
+    def __init__(self) -> None:
+        self.points: Dict[Hashable, Tuple[float, float]] = dict()
+        self.cells: Dict[Tuple[int, int], Set[Hashable]] = dict()
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def get_cell(self, lat: float, long: float) -> Tuple[int, int]:
+        return floor(lat / self.cell_size), floor(long / self.cell_size)
+
+    def add(self, point_id: Hashable, lat: float = None, long: float = None) -> None:
+
+        self.remove(point_id)
+
+        if lat is None or long is None:
+            return
+
+        self.points[point_id] = (lat, long)
+        self.cells.setdefault(self.get_cell(lat, long), set()).add(point_id)
+
+    def remove(self, point_id: Hashable) -> None:
+
+        point = self.points.pop(point_id, None)
+        if point is None:
+            return
+
+        cell = self.get_cell(*point)
+        self.cells[cell].discard(point_id)
+        if len(self.cells[cell]) == 0:
+            del self.cells[cell]
+
+    def search(self, lat: float, long: float, radius_km: float = None) -> Dict[Hashable, float]:
+        """
+            return distance in km of all points within 'radius_km', all points if radius is undefined
+        """
+
+        candidates = self.points.keys()
+
+        if radius_km is not None:
+            lat_span = radius_km / km_per_degree_latitude
+            min_lat_cell, min_long_cell = self.get_cell(max(-90.0, lat - lat_span), -180.0)
+            max_lat_cell, max_long_cell = self.get_cell(min(90.0, lat + lat_span), 180.0)
+
+            # longitude span grows towards the poles, use all longitudes if search area covers a pole
+            max_abs_lat = min(90.0, abs(lat) + lat_span)
+            if max_abs_lat < 90.0:
+                long_span = radius_km / (km_per_degree_latitude * cos(radians(max_abs_lat)))
+                if long_span < 180.0:
+                    min_long_cell = self.get_cell(0, long - long_span)[1]
+                    max_long_cell = self.get_cell(0, long + long_span)[1]
+
+            num_cells = (max_lat_cell - min_lat_cell + 1) * (max_long_cell - min_long_cell + 1)
+
+            # only use grid if it has to look at fewer cells than there are points
+            if num_cells < len(self.points):
+                candidates = set()
+                for lat_cell in range(min_lat_cell, max_lat_cell + 1):
+                    for long_cell in range(min_long_cell, max_long_cell + 1):
+                        # wrap around the antimeridian
+                        long_cell = (long_cell + int(180 / self.cell_size)) % int(360 / self.cell_size) \
+                            - int(180 / self.cell_size)
+                        candidates.update(self.cells.get((lat_cell, long_cell), set()))
+
+        distances = dict()
+        for point_id in candidates:
+            distance = haversine_km(lat, long, *self.points[point_id])
+            if radius_km is None or distance <= radius_km:
+                distances[point_id] = distance
+
+        return distances
+
+# EOF
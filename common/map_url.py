@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from functools import lru_cache
+from typing import Any, Dict, Tuple, Union
+import re
+
+coordinate = r"[-]?\d+\.\d+"
+
+# patterns to parse coordinates out of map links, tried in this order. The first provider
+# which name is part of the link is used, 'default' applies to all other links.
+# Each pattern is only tried if the link contains its literal part, which is a lot cheaper
+# than searching links which can't match.
+map_url_patterns = {
+    "google": [
+        # https://www.google.com/maps/place/Berlin/@52.50,13.14,10z/data=!3m1!4b1!4m6!3m5!1s0x0:0x0!8m2!3d52.52!4d13.40
+        ("!3d", re.compile(rf".*!3d(?P<latitude>{coordinate})!4d(?P<longitude>{coordinate})")),
+        # https://www.google.com/maps/@52.4512,13.4471,15z
+        ("@", re.compile(rf"@(?P<latitude>{coordinate}),(?P<longitude>{coordinate})")),
+        # https://maps.google.com/?q=52.4512,13.4471
+        ("=", re.compile(rf"[?&](?:q|ll|query)=(?P<latitude>{coordinate}),(?P<longitude>{coordinate})"))
+    ],
+    "apple": [
+        # https://maps.apple.com/?ll=52.4512,13.4471&q=Pin
+        ("=", re.compile(rf"[?&](?:ll|sll|coordinate)=(?P<latitude>{coordinate}),(?P<longitude>{coordinate})"))
+    ],
+    "default": [
+        # https://www.openstreetmap.org/#map=15/52.4512/13.4471
+        ("#map=", re.compile(rf"#map=\d+/(?P<latitude>{coordinate})/(?P<longitude>{coordinate})")),
+        # https://www.openstreetmap.org/?mlat=52.4512&mlon=13.4471
+        ("mlat=", re.compile(rf"[?&]mlat=(?P<latitude>{coordinate})&mlon=(?P<longitude>{coordinate})"))
+    ]
+}
+
+map_url_providers = [x for x in map_url_patterns if x != "default"]
+
+# coordinates of already parsed links, cleared once 'parsed_map_urls_size' links have been parsed.
+# A plain dict keeps the lookup of links which have not been parsed before cheaper than lru_cache.
+parsed_map_urls: Dict[str, Union[Tuple[float, float], None]] = dict()
+parsed_map_urls_size = 4096
+
+
+def parse_map_url(url: str) -> Union[Tuple[float, float], None]:
+    """
+    parse coordinates out of a link to OpenStreetMap, Google Maps or Apple Maps
+
+    Parameters
+    ----------
+    url: str
+        link to a map
+
+    Returns
+    -------
+    tuple: latitude and longitude, None if link contains no coordinates
+    """
+
+    if not isinstance(url, str):
+        return
+
+    coordinates = parsed_map_urls.get(url, False)
+    if coordinates is not False:
+        return coordinates
+
+    if len(parsed_map_urls) >= parsed_map_urls_size:
+        parsed_map_urls.clear()
+
+    patterns = map_url_patterns["default"]
+    for provider in map_url_providers:
+        if provider in url:
+            patterns = map_url_patterns[provider]
+            break
+
+    for literal, pattern in patterns:
+        if literal not in url:
+            continue
+
+        match = pattern.search(url)
+        if match:
+            coordinates = float(match.group("latitude")), float(match.group("longitude"))
+            break
+    else:
+        coordinates = None
+
+    parsed_map_urls[url] = coordinates
+
+    return coordinates
+
+
+@lru_cache(maxsize=4096)
+def format_map_url(template: str, lat: Any, long: Any) -> str:
+    """
+    return link to a map for these coordinates by formatting the 'template' ({lat} and {long})
+    """
+
+    return template.format(lat=lat, long=long)
+
+# EOF
@@ -8,8 +8,11 @@
 #  repository or visit: <https://opensource.org/licenses/MIT>.
 
 from typing import List, Any, Union
+import html
+import json
 import re
 
+from fastapi.encoders import jsonable_encoder
 from phpserialize import loads, dumps
 
 
@@ -164,6 +167,26 @@ def split_quoted_string(string_to_split: str, character_to_split_at: str = ",",
     return parts
 
 
+def strip_html(text: str) -> Union[str, None]:
+    """
+    strip all html tags from a text and unescape html entities
+
+    Parameters
+    ----------
+    text: str
+        html text to strip
+
+    Returns
+    -------
+    str: plain text
+    """
+
+    if not isinstance(text, str):
+        return
+
+    return html.unescape(re.sub(r"<[^>]+>", " ", text))
+
+
 def php_deserialize(input_data: str) -> Any:
     """
     deserialize a php array/object
@@ -209,4 +232,12 @@ def php_serialize(data: dict) -> Union[str, None]:
         except Exception:
             pass
 
+
+def dump_json(content: Any) -> bytes:
+    """
+        serialize content the same way as JSONResponse does
+    """
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
 # EOF
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Hashable, List
+
+
+class SortedIndex:
+    """
+        keeps ids sorted by a comparable key (i.e. epoch seconds) in parallel arrays.
+        range queries are answered with two binary searches and a slice.
+    """
+
+    def __init__(self) -> None:
+        self.keys: List[Any] = list()
+        self.ids: List[Hashable] = list()
+        self.entries: Dict[Hashable, Any] = dict()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entry_id: Hashable, key: Any = None) -> None:
+
+        self.remove(entry_id)
+
+        if key is None:
+            return
+
+        index = bisect_right(self.keys, key)
+        self.keys.insert(index, key)
+        self.ids.insert(index, entry_id)
+        self.entries[entry_id] = key
+
+    def remove(self, entry_id: Hashable) -> None:
+
+        if entry_id not in self.entries:
+            return
+
+        index = bisect_left(self.keys, self.entries.pop(entry_id))
+        while self.ids[index] != entry_id:
+            index += 1
+
+        del self.keys[index]
+        del self.ids[index]
+
+    def range(self, lower: Any = None, upper: Any = None,
+              include_lower: bool = False, include_upper: bool = False) -> List[Hashable]:
+        """
+            return ids with keys between 'lower' and 'upper' in ascending key order.
+            undefined bounds are unlimited.
+        """
+
+        start = 0
+        if lower is not None:
+            start = bisect_left(self.keys, lower) if include_lower else bisect_right(self.keys, lower)
+
+        end = len(self.keys)
+        if upper is not None:
+            end = bisect_right(self.keys, upper) if include_upper else bisect_left(self.keys, upper)
+
+        return self.ids[start:end]
+
+    def equal(self, key: Any) -> List[Hashable]:
+        return self.range(key, key, include_lower=True, include_upper=True)
+
+# EOF
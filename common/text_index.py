@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple, Hashable
+import re
+
+
+class SubstringIndex:
+    """
+        n-gram inverted index for case insensitive substring search of one text per document
+    """
+
+    gram_size = 3
+
+    def __init__(self) -> None:
+        self.documents: Dict[Hashable, str] = dict()
+        self.grams: Dict[str, Set[Hashable]] = dict()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @classmethod
+    def get_grams(cls, text: str) -> Set[str]:
+        return {text[i:i + cls.gram_size] for i in range(len(text) - cls.gram_size + 1)}
+
+    def add(self, doc_id: Hashable, text: str = None) -> None:
+
+        self.remove(doc_id)
+
+        if not isinstance(text, str):
+            return
+
+        text = text.lower()
+        self.documents[doc_id] = text
+        for gram in self.get_grams(text):
+            self.grams.setdefault(gram, set()).add(doc_id)
+
+    def remove(self, doc_id: Hashable) -> None:
+
+        text = self.documents.pop(doc_id, None)
+        if text is None:
+            return
+
+        for gram in self.get_grams(text):
+            doc_ids = self.grams.get(gram)
+            doc_ids.discard(doc_id)
+            if len(doc_ids) == 0:
+                del self.grams[gram]
+
+    def search(self, value: str) -> Set[Hashable]:
+        """
+            return ids of all documents which contain 'value'
+        """
+
+        value = value.lower()
+
+        if len(value) < self.gram_size:
+            candidates = self.documents.keys()
+        else:
+            # intersect smallest posting lists first
+            postings = sorted([self.grams.get(x, set()) for x in self.get_grams(value)], key=len)
+            candidates = postings[0].intersection(*postings[1:])
+
+        return {x for x in candidates if value in self.documents[x]}
+
+
+class FullTextIndex:
+    """
+        inverted word index with weighted fields. Each query term matches words with this prefix.
+        All query terms have to match and documents are scored by the summed weights of matched words.
+    """
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Dict[Hashable, float]] = dict()
+        self.documents: Dict[Hashable, Set[str]] = dict()
+        self.vocabulary: List[str] = list()
+        self.vocabulary_outdated = False
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return re.findall(r"\w+", text.lower())
+
+    def add(self, doc_id: Hashable, fields: List[Tuple[str, float]]) -> None:
+        """
+            add document as list of (text, weight) tuples
+        """
+
+        self.remove(doc_id)
+
+        weights = defaultdict(float)
+        for text, weight in fields:
+            if not isinstance(text, str):
+                continue
+            for word in self.tokenize(text):
+                weights[word] += weight
+
+        for word, weight in weights.items():
+            if word not in self.postings:
+                self.postings[word] = dict()
+                self.vocabulary_outdated = True
+            self.postings[word][doc_id] = weight
+
+        self.documents[doc_id] = set(weights)
+
+    def remove(self, doc_id: Hashable) -> None:
+
+        for word in self.documents.pop(doc_id, set()):
+            self.postings[word].pop(doc_id, None)
+            if len(self.postings[word]) == 0:
+                del self.postings[word]
+                self.vocabulary_outdated = True
+
+    def search(self, query: str) -> Dict[Hashable, float]:
+        """
+            return scores of all documents matching all query terms
+        """
+
+        if self.vocabulary_outdated is True:
+            self.vocabulary = sorted(self.postings)
+            self.vocabulary_outdated = False
+
+        scores = None
+        for term in self.tokenize(query):
+
+            term_scores = defaultdict(float)
+            index = bisect_left(self.vocabulary, term)
+            while index < len(self.vocabulary) and self.vocabulary[index].startswith(term):
+                for doc_id, weight in self.postings[self.vocabulary[index]].items():
+                    term_scores[doc_id] += weight
+                index += 1
+
+            if scores is None:
+                scores = dict(term_scores)
+            else:
+                scores = {k: v + term_scores[k] for k, v in scores.items() if k in term_scores}
+
+        return scores or dict()
+
+# EOF
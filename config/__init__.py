@@ -13,6 +13,7 @@ import os
 from pydantic import ValidationError
 
 from config.models.app import AppSettings
+from config.models.cache import CacheConfigSettings
 from config.models.calendar import CalendarConfigSettings
 from common.log import get_logger
 
@@ -21,6 +22,7 @@ logger = get_logger()
 
 app_settings = AppSettings(hash_kennels="EMPTY")
 calendar_settings = CalendarConfigSettings()
+cache_settings = CacheConfigSettings()
 
 
 def validate_config_object(config_class, settings):
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from typing import Union
+
+from config.models import EnvOverridesBaseSettings
+
+
+class BinlogConfigSettings(EnvOverridesBaseSettings):
+    enabled: bool = False
+    server_id: int = 4711
+    username: Union[str, None] = None
+    password: Union[str, None] = None
+
+    class Config:
+        env_prefix = f"{__name__.split('.')[-1]}_"
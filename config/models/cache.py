@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from config.models import EnvOverridesBaseSettings
+
+
+class CacheConfigSettings(EnvOverridesBaseSettings):
+    enabled: bool = True
+    event_ttl: int = 3600
+    cold_event_ttl: int = 86400
+    response_ttl: int = 300
+    max_responses: int = 1000
+    negative_ttl: int = 60
+
+    class Config:
+        env_prefix = f"{__name__.split('.')[-1]}_"
@@ -8,6 +8,7 @@
 #  repository or visit: <https://opensource.org/licenses/MIT>.
 
 from logging.config import dictConfig as logDictConfig
+import asyncio
 import os
 
 from fastapi import FastAPI
@@ -15,6 +16,8 @@ from starlette.responses import RedirectResponse
 
 from config.models.api import APIConfigSettings
 from config.models.app import AppSettings
+from config.models.binlog import BinlogConfigSettings
+from config.models.cache import CacheConfigSettings
 from config.models.calendar import CalendarConfigSettings
 from config.models.database import DBSettings
 from config.models.main import MainConfigSettings
@@ -23,8 +26,11 @@ from config.log import default_log_level, request_logger_config
 from config.api import BasicAPISettings
 import config
 from api.security import api_key_valid, set_api_key
-from api.routers import runs, send_newsletter
+from api.routers import cache, runs, send_newsletter
+from api.stream import RunEventBroadcaster
+from source.binlog import BinlogConsumer, get_binlog_consumer
 from source.database import setup_db_handler
+from source.event_store import setup_event_store, get_event_store
 from source.manage_event_fields import update_event_manager_fields
 from common.log import setup_logging
 
@@ -111,6 +117,29 @@ def get_app() -> FastAPI:
     # get calendar settings
     config.calendar_settings = config.get_config_object(config_handler, CalendarConfigSettings)
 
+    # initialize event cache
+    config.cache_settings = config.get_config_object(config_handler, CacheConfigSettings)
+
+    if config.cache_settings.enabled is True:
+        store = setup_event_store(ttl=config.cache_settings.event_ttl,
+                                  response_ttl=config.cache_settings.response_ttl,
+                                  negative_ttl=config.cache_settings.negative_ttl,
+                                  cold_ttl=config.cache_settings.cold_event_ttl,
+                                  max_responses=config.cache_settings.max_responses,
+                                  hot_weeks=config.calendar_settings.num_past_weeks_exposed)
+
+        # evicted events might be new or modified posts, statistics used to plan queries are outdated
+        store.subscribe(lambda action, post_id: conn.statistics.clear() if action == "evict" else None)
+
+    # initialize MySQL binlog consumer to invalidate cached events
+    binlog_settings = config.get_config_object(config_handler, BinlogConfigSettings)
+
+    if binlog_settings.enabled is True:
+        if config.cache_settings.enabled is False:
+            log.warning("Cache is disabled, not starting MySQL binlog consumer")
+        else:
+            BinlogConsumer(binlog_settings, db_settings)
+
     # initialize listmonk
     listmonk_settings = config.get_config_object(config_handler, ListMonkSettings)
 
@@ -129,9 +158,19 @@ def get_app() -> FastAPI:
     # create FastAPI instance
     server = FastAPI(**basic_api_settings.dict())
 
+    # start broadcasting run updates
+    @server.on_event("startup")
+    async def startup():
+        if get_event_store() is not None:
+            RunEventBroadcaster(get_event_store(), asyncio.get_running_loop())
+        if get_binlog_consumer() is not None:
+            get_binlog_consumer().start(asyncio.get_running_loop())
+
     # close DB connection on shutdown
     @server.on_event("shutdown")
     async def shutdown():
+        if get_binlog_consumer() is not None:
+            get_binlog_consumer().stop()
         if conn is not None:
             conn.close()
 
@@ -152,6 +191,9 @@ def get_app() -> FastAPI:
     # add runs routes
     server.include_router(runs.router_runs)
 
+    # add cache routes
+    server.include_router(cache.router_cache)
+
     if listmonk_settings.enabled is True:
         # add newsletter post route
         server.include_router(send_newsletter.newsletter)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+import asyncio
+from threading import Thread, Event
+from typing import Union
+
+from common.log import get_logger
+from config.models.binlog import BinlogConfigSettings
+from config.models.database import DBSettings
+from source.event_store import get_event_store
+
+# optional dependency
+try:
+    # noinspection PyPackageRequirements
+    from pymysqlreplication import BinLogStreamReader
+    # noinspection PyPackageRequirements
+    from pymysqlreplication.row_event import WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent
+except ImportError:
+    BinLogStreamReader = None
+
+log = get_logger()
+consumer = None
+
+
+class BinlogConsumer:
+    """
+        tails the MySQL binlog (change data capture) and evicts changed events from the event store.
+        requires the MySQL server to run with 'binlog_format = ROW' and a user with the
+        'REPLICATION SLAVE' and 'REPLICATION CLIENT' privileges.
+
+        The binlog is read in a separate thread, changes are applied to the event store within the
+        event loop as the store is not thread safe.
+    """
+
+    tables = ["wp_posts", "wp_postmeta", "wp_options"]
+
+    # changes to these options invalidate all parsed events
+    watched_options = ["event_manager_submit_event_form_fields"]
+
+    # post meta which is updated by WordPress while editing a post
+    ignored_meta_key_prefix = "_edit_"
+
+    def __init__(self, config: BinlogConfigSettings, db_settings: DBSettings) -> None:
+
+        global consumer
+
+        self.config = config
+        self.db_settings = db_settings
+        self.stream = None
+        self.loop = None
+        self.stopped = Event()
+        self.thread = Thread(target=self.run, name="binlog-consumer", daemon=True)
+
+        consumer = self
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> bool:
+
+        if BinLogStreamReader is None:
+            log.error("Python module 'mysql-replication' not installed, unable to start binlog consumer")
+            return False
+
+        log.info("Starting MySQL binlog consumer")
+        self.loop = loop
+        self.thread.start()
+
+        return True
+
+    def stop(self) -> None:
+
+        self.stopped.set()
+        if self.stream is not None:
+            self.stream.close()
+
+    def run(self) -> None:
+
+        self.stream = BinLogStreamReader(
+            connection_settings={
+                "host": self.db_settings.host,
+                "port": self.db_settings.port,
+                "user": self.config.username or self.db_settings.username,
+                "passwd": self.config.password or self.db_settings.password
+            },
+            server_id=self.config.server_id,
+            only_events=[WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent],
+            only_schemas=[self.db_settings.name],
+            only_tables=self.tables,
+            resume_stream=True,
+            blocking=True
+        )
+
+        try:
+            for binlog_event in self.stream:
+                if self.stopped.is_set():
+                    break
+
+                for row in binlog_event.rows:
+                    self.handle_row(binlog_event.table, row.get("after_values") or row.get("values") or dict(),
+                                    deleted=isinstance(binlog_event, DeleteRowsEvent))
+
+        except Exception as e:
+            if not self.stopped.is_set():
+                log.error(f"MySQL binlog consumer failed: {e}")
+        finally:
+            self.stream.close()
+
+        log.info("MySQL binlog consumer stopped")
+
+    def handle_row(self, table: str, values: dict, deleted: bool = False) -> None:
+        """
+            called from the binlog thread, hands the change over to the event loop
+        """
+        self.loop.call_soon_threadsafe(self.apply_row, table, values, deleted)
+
+    def apply_row(self, table: str, values: dict, deleted: bool = False) -> None:
+
+        store = get_event_store()
+        if store is None:
+            return
+
+        if table == "wp_options":
+            if values.get("option_name") in self.watched_options:
+                log.debug(f"binlog: option '{values.get('option_name')}' changed")
+                store.evict()
+
+        elif table == "wp_posts":
+            if values.get("post_type") == "event_listing" and deleted is True:
+                log.debug(f"binlog: event id '{values.get('ID')}' deleted")
+                store.purge(values.get("ID"))
+            elif values.get("post_type") == "event_listing":
+                log.debug(f"binlog: event id '{values.get('ID')}' changed")
+                store.evict(values.get("ID"))
+
+        # meta data of other post types is ignored, new events are already evicted by their post row
+        elif table == "wp_postmeta":
+            if values.get("post_id") in store.known_post_ids and \
+                    not str(values.get("meta_key")).startswith(self.ignored_meta_key_prefix):
+                log.debug(f"binlog: meta data of post id '{values.get('post_id')}' changed")
+                store.evict(values.get("post_id"))
+
+
+def get_binlog_consumer() -> Union[BinlogConsumer, None]:
+    global consumer
+    return consumer
+
+# EOF
@@ -8,15 +8,55 @@
 #  repository or visit: <https://opensource.org/licenses/MIT>.
 
 from datetime import datetime
-from typing import Any, Dict, List, AnyStr, Union
+from sys import intern
+from typing import Any, Callable, Dict, Iterator, List, AnyStr, Tuple, Union
 # noinspection PyPackageRequirements
 import mysql.connector
+from common.cache import TTLCache
 from common.log import get_logger
 
 log = get_logger()
 conn = None
 
 
+class PostMeta:
+    """
+        compact record of a single post meta data row
+    """
+
+    __slots__ = ("post_id", "meta_key", "meta_value")
+
+    def __init__(self, post_id: int, meta_key: str, meta_value: Any) -> None:
+        self.post_id = post_id
+        self.meta_key = meta_key
+        self.meta_value = meta_value
+
+
+class QueryPlan:
+    """
+        strategy to fetch event posts. 'posts_first' scans all event posts, 'meta_first' looks up
+        the ids of candidate posts by the most selective meta data condition first.
+    """
+
+    def __init__(self, strategy: str = "posts_first", total_rows: int = None) -> None:
+        self.strategy = strategy
+        self.total_rows = total_rows
+        self.meta_key = None
+        self.meta_values = None
+        self.estimated_rows = None
+        self.timings: Dict[str, float] = dict()
+
+    def dict(self) -> Dict[str, Any]:
+        return {
+            "strategy": self.strategy,
+            "total_rows": self.total_rows,
+            "meta_key": self.meta_key,
+            "meta_values": self.meta_values,
+            "estimated_rows": self.estimated_rows,
+            "timings_ms": {k: round(v * 1000, 3) for k, v in self.timings.items()}
+        }
+
+
 class DBConnection:
 
     session = None
@@ -27,6 +67,15 @@ class DBConnection:
     port = None
 
     connection_timeout = 2
+    stream_chunk_size = 1000
+    posts_page_size = 1000
+
+    # post statistics and meta value counts are cached for this many seconds
+    statistics_ttl = 300
+    # terms of a taxonomy (e.g. event types) are cached for this many seconds
+    terms_ttl = 300
+    # fetch candidates via meta data if a condition matches at most this share of all event posts
+    meta_first_max_selectivity = 0.05
 
     def __init__(self, host_name: str, user_name: str, user_password: str, db_name: str, db_port: int = 3306) -> None:
         self.host = host_name
@@ -34,6 +83,8 @@ class DBConnection:
         self.password = user_password
         self.database = db_name
         self.port = db_port
+        self.statistics = TTLCache(self.statistics_ttl)
+        self.terms = TTLCache(self.terms_ttl)
 
         if self.session is None:
             self.init_session()
@@ -58,7 +109,7 @@ class DBConnection:
         # disable caching
         self.session.autocommit = True
 
-    def execute_select_query(self, query: str) -> List[Dict]:
+    def execute_select_query(self, query: str, params: Tuple = None) -> List[Dict]:
         log.debug(f"Performing DB query: {query}")
 
         if self.session is None or self.session.is_connected() is not True:
@@ -66,7 +117,7 @@ class DBConnection:
 
         try:
             cursor = self.session.cursor(dictionary=True)
-            cursor.execute(query)
+            cursor.execute(query, params)
             rows = cursor.fetchall()
             if rows is not None:
                 log.debug(f"DB returned '{len(rows)}' result%s" % ("s" if len(rows) != 1 else ""))
@@ -76,6 +127,41 @@ class DBConnection:
 
         return list()
 
+    def stream_select_query(self, query: str, chunk_size: int = None,
+                            dictionary: bool = True) -> Iterator[Union[Dict, Tuple]]:
+        """
+            yield rows of a select query, fetched in chunks of 'chunk_size' from an unbuffered cursor.
+            The session can't be used for other queries until all rows are consumed or the generator is closed.
+            If 'dictionary' is False, rows are returned as tuples in the order of the selected columns.
+        """
+        log.debug(f"Performing streaming DB query: {query}")
+
+        if self.session is None or self.session.is_connected() is not True:
+            self.init_session()
+
+        cursor = None
+        num_rows = 0
+        try:
+            cursor = self.session.cursor(dictionary=dictionary, buffered=False)
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(chunk_size or self.stream_chunk_size)
+                if not rows:
+                    break
+                num_rows += len(rows)
+                yield from rows
+            log.debug(f"DB returned '{num_rows}' result%s" % ("s" if num_rows != 1 else ""))
+        except mysql.connector.Error as e:
+            log.error(f"DB error occurred: {e}")
+        finally:
+            # discard rows which have not been read if consumer stopped early
+            if cursor is not None and getattr(self.session, "unread_result", False) is True:
+                # noinspection PyBroadException
+                try:
+                    self.session.consume_results()
+                except Exception as e:
+                    log.error(f"DB error occurred: {e}")
+
     def execute_insert_query(self, query: str) -> List[Dict]:
         log.debug(f"Performing DB query: {query}")
 
@@ -109,9 +195,70 @@ class DBConnection:
 
         return 0
 
+    def get_terms(self, taxonomy: str) -> Dict[int, str]:
+        """
+            return names of all terms of a taxonomy as term_taxonomy_id: name, cached for 'terms_ttl'
+        """
+
+        terms = self.terms.get(taxonomy)
+        if terms is not None:
+            return terms
+
+        query = """
+                SELECT wp_tax.term_taxonomy_id, wp_t.name
+                FROM wp_term_taxonomy as wp_tax
+                JOIN wp_terms as wp_t ON wp_t.term_id = wp_tax.term_id
+                WHERE wp_tax.taxonomy = %s
+                """
+
+        terms = {int(x.get("term_taxonomy_id")): x.get("name") for x in self.execute_select_query(query, (taxonomy,))}
+
+        if len(terms) > 0:
+            self.terms.set(taxonomy, terms)
+
+        return terms
+
+    @staticmethod
+    def get_event_type_column() -> str:
+        """
+            return column with the id of the event type term of each post. Posts can be assigned to more than
+            one event type, the lowest term id is picked to return a single row per post. Names of event types
+            are resolved with DBConnection.resolve_event_types()
+        """
+
+        return """
+                (SELECT MIN(t.term_taxonomy_id) FROM wp_term_relationships as t
+                 JOIN wp_term_taxonomy as tax ON tax.term_taxonomy_id = t.term_taxonomy_id
+                 WHERE t.object_id = p.id AND tax.taxonomy = 'event_listing_type') as term_taxonomy_id
+                """
+
+    def resolve_event_types(self, posts: List[Dict]) -> List[Dict]:
+        """
+            replace 'term_taxonomy_id' of each post with the name of the event type as 'post_type'
+        """
+
+        event_types = self.get_terms("event_listing_type")
+
+        # event type has been added since terms have been cached
+        if any([x.get("term_taxonomy_id") not in event_types for x in posts
+                if x.get("term_taxonomy_id") is not None]):
+            self.terms.pop("event_listing_type")
+            event_types = self.get_terms("event_listing_type")
+
+        for post in posts:
+            post["post_type"] = event_types.get(post.pop("term_taxonomy_id", None))
+
+        return posts
+
     def get_posts(
             self, post_id: int = None, last_update: datetime = None,
-            compare_type: str = "eq", limit: int = None) -> List[Dict]:
+            compare_type: str = "eq", limit: int = None, post_ids: List[int] = None,
+            with_content: bool = True, before_id: int = None) -> List[Dict]:
+        """
+            if 'with_content' is False, only the length of each post content is returned as
+            'post_content_length'. The content itself can be fetched later with DBConnection.get_posts_content.
+            Posts are ordered by descending id, 'before_id' and 'limit' can be used to fetch them page by page.
+        """
 
         if compare_type not in ["lt", "gt", "eq"]:
             raise ValueError("attribute 'compare_type' must be one of: lt, gt, eq")
@@ -120,22 +267,23 @@ class DBConnection:
             raise ValueError(f"attribute 'last_update' must be of type 'datetime' got: {type(last_update)}")
 
         wordpress_post_type = "event_listing"
-        wordpress_taxonomy_type = "event_listing_type"
+        content_column = "p.post_content" if with_content is True else "LENGTH(p.post_content) as post_content_length"
         query = f"""
-                SELECT p.id, p.post_content, p.post_title, p.post_modified, p.post_status, p.guid, event_type.name as post_type
+                SELECT p.id, {content_column}, p.post_title, p.post_modified, p.post_modified_gmt, p.post_status,
+                       p.guid, {self.get_event_type_column()}
                 FROM wp_posts as p
-                LEFT JOIN (
-                    SELECT t.object_id, wp_t.name
-                    FROM  wp_term_relationships as t
-                    LEFT JOIN wp_terms as wp_t ON t.term_taxonomy_id = wp_t.term_id
-                    LEFT OUTER JOIN wp_term_taxonomy as wp_tax ON t.term_taxonomy_id = wp_tax.term_taxonomy_id
-                    WHERE wp_tax.taxonomy = '{wordpress_taxonomy_type}'
-                ) event_type ON event_type.object_id = p.id WHERE p.post_type = '{wordpress_post_type}'
+                WHERE p.post_type = '{wordpress_post_type}'
                 """
 
         if post_id is not None:
             query += f" AND p.id = {post_id}"
 
+        if isinstance(post_ids, list):
+            query += f" AND p.id IN ({','.join(map(str, map(int, post_ids))) or 'NULL'})"
+
+        if before_id is not None:
+            query += f" AND p.id < {int(before_id)}"
+
         if last_update is not None:
             compare_string = "="
             if compare_type == "lt":
@@ -150,15 +298,152 @@ class DBConnection:
         if isinstance(limit, int):
             query += f" LIMIT {limit}"
 
-        return self.execute_select_query(query)
+        return self.resolve_event_types(self.execute_select_query(query))
+
+    def get_posts_content(self, post_ids: List[int]) -> Dict[int, str]:
+        """
+            fetch the content of all requested posts with a single query, returns post id: post content
+        """
 
-    def get_posts_meta(self, post_ids: List[int] = None) -> List[Dict]:
-        query = "SELECT * FROM `wp_postmeta`"
+        if len(post_ids) == 0:
+            return dict()
+
+        query = f"SELECT id, post_content FROM wp_posts WHERE id IN ({','.join(map(str, map(int, post_ids)))})"
+
+        return {x.get("id"): x.get("post_content") for x in self.execute_select_query(query) or list()}
+
+    def get_posts_statistics(self) -> Tuple[int, Union[datetime, None]]:
+        """
+            return number of event posts and the most recent modification time of any event post.
+            Statistics are cached for 'statistics_ttl' seconds or until they get cleared.
+        """
+
+        cache_key = "posts"
+        statistics = self.statistics.get(cache_key)
+        if statistics is not None:
+            return statistics
+
+        query = "SELECT COUNT(*) as num_posts, MAX(post_modified_gmt) as last_modified " \
+                "FROM wp_posts WHERE post_type = 'event_listing'"
+
+        rows = self.execute_select_query(query) or [dict()]
+
+        statistics = int(rows[0].get("num_posts") or 0), rows[0].get("last_modified")
+
+        self.statistics.set(cache_key, statistics)
+
+        return statistics
+
+    def get_meta_value_counts(self, meta_key: str, last_modified: datetime = None) -> Dict[Any, int]:
+        """
+            return number of event posts per meta value of 'meta_key'. Counts are cached and
+            queried again once an event post has been modified after 'last_modified'
+        """
+
+        cache_key = (meta_key, last_modified)
+        counts = self.statistics.get(cache_key)
+        if counts is not None:
+            return counts
+
+        query = """
+                SELECT m.meta_value, COUNT(*) as num_posts
+                FROM wp_postmeta as m
+                JOIN wp_posts as p ON p.id = m.post_id
+                WHERE m.meta_key = %s AND p.post_type = 'event_listing'
+                GROUP BY m.meta_value
+                """
+
+        counts = {x.get("meta_value"): int(x.get("num_posts")) for x in self.execute_select_query(query, (meta_key,))}
+
+        self.statistics.set(cache_key, counts)
+
+        return counts
+
+    def plan_posts_query(self, meta_conditions: Dict[str, Callable[[Any], bool]]) -> QueryPlan:
+        """
+            choose the strategy to fetch event posts. 'meta_conditions' contains a predicate per meta key,
+            a post can only be returned if the predicate is True for its meta value. Matching values and the
+            number of posts per condition are estimated from cached meta value counts.
+        """
+
+        if len(meta_conditions) == 0:
+            return QueryPlan()
+
+        total_rows, last_modified = self.get_posts_statistics()
+        plan = QueryPlan(total_rows=total_rows)
+
+        for meta_key, predicate in meta_conditions.items():
+            counts = self.get_meta_value_counts(meta_key, last_modified)
+            meta_values = [x for x in counts if predicate(x) is True]
+            estimated_rows = sum([counts[x] for x in meta_values])
+
+            if plan.estimated_rows is None or estimated_rows < plan.estimated_rows:
+                plan.meta_key = meta_key
+                plan.meta_values = meta_values
+                plan.estimated_rows = estimated_rows
+
+        if plan.estimated_rows <= total_rows * self.meta_first_max_selectivity:
+            plan.strategy = "meta_first"
+
+        return plan
+
+    def get_meta_post_ids(self, meta_key: str, meta_values: List[Any]) -> List[int]:
+        """
+            return ids of all posts with one of these meta values
+        """
+
+        if len(meta_values) == 0:
+            return list()
+
+        query = f"SELECT DISTINCT post_id FROM wp_postmeta WHERE meta_key = %s " \
+                f"AND meta_value IN ({', '.join(['%s'] * len(meta_values))})"
+
+        return [int(x.get("post_id")) for x in self.execute_select_query(query, (meta_key, *meta_values))]
+
+    def get_post_with_meta(self, post_id: int) -> List[Dict]:
+        """
+            point lookup of a single event post including all its meta data.
+            returns one row per meta data entry, each containing all post columns
+        """
+
+        wordpress_post_type = "event_listing"
+        query = f"""
+                SELECT p.id, p.post_content, p.post_title, p.post_modified, p.post_modified_gmt, p.post_status, p.guid,
+                       m.meta_key, m.meta_value, {self.get_event_type_column()}
+                FROM wp_posts as p
+                LEFT JOIN wp_postmeta as m ON m.post_id = p.id
+                WHERE p.id = {int(post_id)} AND p.post_type = '{wordpress_post_type}'
+                """
+
+        return self.resolve_event_types(self.execute_select_query(query))
+
+    def get_posts_meta(self, post_ids: List[int] = None,
+                       stream: bool = False) -> Union[List[Dict], Iterator[PostMeta]]:
+        """
+            if 'stream' is True, rows are returned as generator of PostMeta records ordered by descending
+            post id (same as DBConnection.get_posts) and in insert order per post
+        """
+        columns = "`post_id`, `meta_key`, `meta_value`" if stream is True else "*"
+        query = f"SELECT {columns} FROM `wp_postmeta`"
         if isinstance(post_ids, list):
             query += f" WHERE `post_id` IN ({','.join(map(str, post_ids))})"
 
+        if stream is True:
+            query += " ORDER BY `post_id` DESC, `meta_id` ASC"
+            return self.stream_posts_meta(query)
+
         return self.execute_select_query(query)
 
+    def stream_posts_meta(self, query: str) -> Iterator[PostMeta]:
+        """
+            decode tuple rows into PostMeta records. Meta keys repeat for every post and get interned
+        """
+
+        for post_id, meta_key, meta_value in self.stream_select_query(query, dictionary=False):
+            if isinstance(meta_key, str):
+                meta_key = intern(meta_key)
+            yield PostMeta(int(post_id), meta_key, meta_value)
+
     def add_post_meta(self, post_id, meta_key, meta_value):
         query = "INSERT INTO `wp_postmeta` " \
                         "( `post_id`,   `meta_key`,   `meta_value`) " \
@@ -219,6 +504,13 @@ class DBConnection:
 
         return True
 
+    def copy(self) -> "DBConnection":
+        """
+            return a new connection with a separate session
+        """
+        return DBConnection(host_name=self.host, user_name=self.user, user_password=self.password,
+                            db_name=self.database, db_port=self.port)
+
     def close(self):
         log.debug("Closing DB session")
         if self.session is not None:
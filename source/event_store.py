@@ -0,0 +1,514 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import Callable, Dict, Iterator, List, Set, Tuple, Union
+
+from pytz import utc
+
+from api.models.run import Hash, HashParams
+from common.cache import TTLCache
+from common.log import get_logger
+from common.misc import strip_html, dump_json
+from common.text_index import SubstringIndex, FullTextIndex
+from common.geo_index import GeoGridIndex
+from common.sorted_index import SortedIndex
+from common.bitmap_index import BitmapIndex
+from source.run_stats import RunStatistics
+
+log = get_logger()
+store = None
+
+
+class EventStore:
+    """
+        holds already parsed runs/events by post id. Each entry is only valid as long as the
+        'post_modified' time of the WordPress post has not changed.
+
+        Also holds the caches which are derived from these events (API responses, serialized
+        JSON fragments and rendered icalendar events) and the WordPress options needed to parse them.
+        These get evicted together with the events.
+
+        Tracks all event post ids seen in WordPress in order to detect events which have been
+        permanently deleted (purged) from WordPress. After a complete listing of all posts the known
+        post ids are used to reject lookups of unknown ids without querying the DB. Additionally, ids
+        which have not been found get cached for a short time (negative cache).
+
+        All stored events are added to text indexes, a geo index, sorted indexes and a columnar
+        bitmap index, to resolve substring filters, full text, proximity, range and flag/category
+        searches to sets of matching post ids.
+
+        After all events have been parsed with a complete listing of all posts, the post ids are
+        kept as a snapshot. Within 'response_ttl' and as long as no event got evicted, runs can
+        be served from this snapshot without querying the DB. Queries for changes (last update)
+        are never served from the snapshot, as it would miss posts modified since.
+
+        Run statistics are maintained incrementally with every stored and purged event.
+
+        Events are partitioned into a hot set (future runs and runs within the past 'hot_weeks') and
+        a cold set of historic runs. Hot events get serialized to JSON as soon as they are stored.
+        Cold events are rarely requested, they get serialized on demand and are kept for 'cold_ttl'.
+        The next upcoming run per kennel is answered from the hot set and kept until it started or
+        any event changed.
+
+        Subscribers get notified with (action, post_id) on every change. Action is one of:
+        insert, update, evict, purge
+    """
+
+    # fields which can be filtered by substring
+    text_fields = ["event_name", "hares", "location_name"]
+
+    # low cardinality fields, filtered by value or by substring of one of the few distinct values
+    column_fields = ["deleted", "run_is_counted", "event_geographic_scope"]
+    column_text_fields = ["kennel_name", "event_type"]
+
+    # fields and their weight for full text search
+    search_fields = {
+        "event_name": 4,
+        "hares": 2,
+        "location_name": 2,
+        "kennel_name": 1,
+        "event_type": 1,
+        "geo_location_name": 1,
+        "location_additional_info": 1,
+        "event_description": 1
+    }
+
+    def __init__(self, ttl: int = 3600, response_ttl: int = 300, negative_ttl: int = 60,
+                 cold_ttl: int = 86400, hot_weeks: int = 2, max_responses: int = 1000) -> None:
+        self.events = TTLCache(ttl)
+        self.cold_ttl = cold_ttl
+        self.hot_window = timedelta(weeks=hot_weeks)
+        self.next_runs: Dict[Union[str, None], Union[Hash, None]] = dict()
+        self.icalendar = TTLCache(ttl)
+        self.fragments = TTLCache(ttl)
+        self.responses = TTLCache(response_ttl, max_size=max_responses)
+        self.options = TTLCache(ttl)
+        self.missing = TTLCache(negative_ttl)
+        self.known_post_ids: Set[int] = set()
+        self.known_post_ids_ttl = response_ttl
+        self.known_post_ids_synced: Union[float, None] = None
+        self.post_modified: Dict[int, datetime] = dict()
+        self.purged_post_ids: Dict[int, datetime] = dict()
+        self.text_indexes = {x: SubstringIndex() for x in self.text_fields}
+        self.search_index = FullTextIndex()
+        self.geo_index = GeoGridIndex()
+        self.range_indexes = {x: SortedIndex() for x in ["start_date", "run_number"]}
+        self.columns = BitmapIndex()
+        self.stats = RunStatistics()
+        self.snapshot: Union[List[int], None] = None
+        self.snapshot_post_ids: Set[int] = set()
+        self.snapshot_synced: Union[float, None] = None
+        self.subscribers: List[Callable] = list()
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def subscribe(self, callback: Callable) -> None:
+        self.subscribers.append(callback)
+
+    def notify(self, action: str, post_id: Union[int, None] = None) -> None:
+        for callback in self.subscribers:
+            # noinspection PyBroadException
+            try:
+                callback(action, post_id)
+            except Exception as e:
+                log.error(f"Event store subscriber '{callback.__name__}' failed: {e}")
+
+    def get(self, post_id: int, post_modified: datetime = None) -> Union[Hash, None]:
+        """
+            return a copy of a stored run, as callers are allowed to alter the returned object.
+            if 'post_modified' is passed then the entry needs to match this modification time
+        """
+
+        entry = self.events.get(post_id)
+        if entry is None:
+            return
+
+        stored_post_modified, run = entry
+        if post_modified is not None and post_modified != stored_post_modified:
+            return
+
+        return run.copy()
+
+    def set(self, run: Hash, post_modified: datetime) -> None:
+
+        previous_post_modified = self.post_modified.get(run.id)
+
+        is_hot = self.is_hot(run)
+
+        self.post_modified[run.id] = post_modified
+        self.events.set(run.id, (post_modified, run.copy()), None if is_hot else self.cold_ttl)
+        self.index(run)
+        if is_hot is True:
+            self.fragments.set(run.id, (run.last_update, dump_json(run)))
+        else:
+            self.fragments.pop(run.id)
+        self.next_runs.clear()
+
+        # snapshot would miss this event
+        if run.id not in self.snapshot_post_ids:
+            self.snapshot = None
+
+        # only notify about actual changes, not about re-parsed events
+        if previous_post_modified is None:
+            self.notify("insert", run.id)
+        elif previous_post_modified != post_modified:
+            self.notify("update", run.id)
+
+    def evict(self, post_id: int = None) -> int:
+        """
+            evict a single event or all events if 'post_id' is undefined
+        """
+
+        if post_id is None:
+            num_evicted = self.events.clear()
+            self.icalendar.clear()
+            self.fragments.clear()
+            self.options.clear()
+            self.missing.clear()
+        else:
+            num_evicted = 1 if self.events.pop(post_id) is True else 0
+            self.icalendar.pop(post_id)
+            self.fragments.pop(post_id)
+            self.missing.pop(post_id)
+
+        # responses can contain any event
+        self.responses.clear()
+
+        # the evicted post could be a new one, known post ids need to be synced again
+        self.known_post_ids_synced = None
+        self.snapshot = None
+        self.next_runs.clear()
+
+        log.debug(f"Evicted '{num_evicted}' event%s from event store" % ("s" if num_evicted != 1 else ""))
+
+        self.notify("evict", post_id)
+
+        return num_evicted
+
+    def is_hot(self, run: Hash) -> bool:
+        """
+            returns True if run starts in the future or started within the hot window
+        """
+
+        if not isinstance(run.start_date, datetime):
+            return False
+
+        now = datetime.now(tz=utc) if run.start_date.tzinfo is not None else datetime.now()
+
+        return run.start_date >= now - self.hot_window
+
+    def get_fragment(self, run: Hash) -> bytes:
+        """
+            return run serialized as JSON, cold runs get serialized on first request
+        """
+
+        last_update, fragment = self.fragments.get(run.id, (None, None))
+        if fragment is not None and last_update == run.last_update:
+            return fragment
+
+        fragment = dump_json(run)
+        self.fragments.set(run.id, (run.last_update, fragment), None if self.is_hot(run) else self.cold_ttl)
+
+        return fragment
+
+    def get_next_run(self, kennel_name: str = None) -> Union[Hash, None]:
+        """
+            return the next upcoming run which is not deleted or hidden, limited to a kennel if
+            'kennel_name' is set. Only valid as long as the snapshot is valid.
+        """
+
+        now = datetime.now(tz=utc).timestamp()
+        cache_key = kennel_name.lower() if kennel_name is not None else None
+
+        if cache_key in self.next_runs:
+            run = self.next_runs.get(cache_key)
+            if run is None or run.start_date.timestamp() > now:
+                return run.copy() if run is not None else None
+
+        next_run = None
+        for post_id in self.range_indexes["start_date"].range(lower=now):
+            entry = self.events.get(post_id)
+            if entry is None:
+                continue
+
+            _, run = entry
+            if run.deleted is True or run.event_hidden is True:
+                continue
+
+            if cache_key is None or str(run.kennel_name).lower() == cache_key:
+                next_run = run
+                break
+
+        self.next_runs[cache_key] = next_run
+
+        return next_run.copy() if next_run is not None else None
+
+    @classmethod
+    def get_search_fields(cls, run: Hash) -> List[Tuple[str, float]]:
+
+        fields = list()
+        for field, weight in cls.search_fields.items():
+            value = getattr(run, field, None)
+            if field == "event_description":
+                value = strip_html(value)
+            fields.append((value, weight))
+
+        return fields
+
+    def index(self, run: Hash) -> None:
+
+        for field, text_index in self.text_indexes.items():
+            text_index.add(run.id, getattr(run, field, None))
+
+        self.search_index.add(run.id, self.get_search_fields(run))
+        self.geo_index.add(run.id, run.geo_lat, run.geo_long)
+
+        # naive start dates (no time zone configured) can't be compared to filter params
+        start_date = None
+        if isinstance(run.start_date, datetime) and run.start_date.tzinfo is not None:
+            start_date = run.start_date.timestamp()
+
+        self.range_indexes["start_date"].add(run.id, start_date)
+        self.range_indexes["run_number"].add(run.id, run.run_number)
+
+        self.columns.add(run.id, {x: getattr(run, x, None) for x in self.column_fields + self.column_text_fields})
+
+        self.stats.add(run)
+
+    def unindex(self, post_id: int) -> None:
+
+        for text_index in self.text_indexes.values():
+            text_index.remove(post_id)
+
+        self.search_index.remove(post_id)
+        self.geo_index.remove(post_id)
+
+        for range_index in self.range_indexes.values():
+            range_index.remove(post_id)
+
+        self.columns.remove(post_id)
+
+        self.stats.remove(post_id)
+
+    def search_text(self, params: HashParams) -> Union[Set[int], None]:
+        """
+            return ids of all indexed events matching all substring filters in 'params'.
+            Only valid for events which are currently stored. None if no substring filter is set.
+        """
+
+        matches = None
+        for field, text_index in self.text_indexes.items():
+            value = getattr(params, field, None)
+            if not isinstance(value, str):
+                continue
+
+            field_matches = text_index.search(value)
+            matches = field_matches if matches is None else matches & field_matches
+
+        return matches
+
+    def search_columns(self, params: HashParams) -> Union[Set[int], None]:
+        """
+            return ids of all indexed events matching all flag and category filters in 'params'.
+            Filters are combined as bitmasks and only the result is decoded to post ids.
+            Only valid for events which are currently stored. None if no such filter is set.
+        """
+
+        mask = None
+        for field in self.column_fields:
+            value = getattr(params, field, None)
+            if value is None:
+                continue
+
+            field_mask = self.columns.mask(field, value)
+            mask = field_mask if mask is None else mask & field_mask
+
+        for field in self.column_text_fields:
+            value = getattr(params, field, None)
+            if not isinstance(value, str):
+                continue
+
+            value = value.lower()
+            field_mask = self.columns.match(field, lambda x: isinstance(x, str) and value in x.lower())
+            mask = field_mask if mask is None else mask & field_mask
+
+        if mask is None:
+            return
+
+        return self.columns.decode(mask)
+
+    def search_ranges(self, params: HashParams, fields: List[str] = None) -> Union[Set[int], None]:
+        """
+            return ids of all indexed events matching all range filters (eq, gt, lt) in 'params'.
+            Only valid for events which are currently stored. None if no range filter is set.
+        """
+
+        matches = None
+        for field, range_index in self.range_indexes.items():
+            if fields is not None and field not in fields:
+                continue
+
+            for compare_type in ["eq", "gt", "lt"]:
+                value = getattr(params, field if compare_type == "eq" else f"{field}__{compare_type}", None)
+                if value is None:
+                    continue
+
+                # naive values are compared as UTC, same as the DB query does
+                if isinstance(value, datetime):
+                    value = (value.replace(tzinfo=utc) if value.tzinfo is None else value).timestamp()
+
+                # greater and lower than filters also match equal values
+                if compare_type == "gt":
+                    field_matches = set(range_index.range(lower=value, include_lower=True))
+                elif compare_type == "lt":
+                    field_matches = set(range_index.range(upper=value, include_upper=True))
+                else:
+                    field_matches = set(range_index.equal(value))
+
+                matches = field_matches if matches is None else matches & field_matches
+
+        return matches
+
+    def set_snapshot(self, post_ids: List[int]) -> None:
+        """
+            remember post ids (ordered like DBConnection.get_posts) of all parsed events
+        """
+        self.snapshot = post_ids
+        self.snapshot_post_ids = set(post_ids)
+        self.snapshot_synced = monotonic()
+
+    def snapshot_valid(self) -> bool:
+        return self.snapshot is not None and monotonic() - self.snapshot_synced < self.known_post_ids_ttl
+
+    def get_snapshot(self, post_ids: Set[int] = None) -> Union[Iterator[Hash], None]:
+        """
+            return copies of all runs of the current snapshot, limited to 'post_ids' if defined.
+            None if the snapshot is outdated or not all runs are stored anymore.
+        """
+
+        if self.snapshot_valid() is False:
+            return
+
+        snapshot_post_ids = self.snapshot
+        if post_ids is not None:
+            snapshot_post_ids = sorted(self.snapshot_post_ids.intersection(post_ids), reverse=True)
+
+        entries = [self.events.get(x) for x in snapshot_post_ids]
+        if None in entries:
+            return
+
+        return (run.copy() for _, run in entries)
+
+    def discard(self, post_id: int) -> None:
+        """
+            remove a stored event whose post can't be parsed as event anymore
+        """
+
+        if post_id not in self.post_modified:
+            return
+
+        log.debug(f"Event id '{post_id}' can't be parsed anymore, removing it from event store")
+
+        self.post_modified.pop(post_id, None)
+        self.unindex(post_id)
+        self.events.pop(post_id)
+        self.icalendar.pop(post_id)
+        self.fragments.pop(post_id)
+        self.responses.clear()
+        self.snapshot = None
+        self.next_runs.clear()
+
+    def purge(self, post_id: int) -> None:
+        """
+            record an event as permanently deleted from WordPress
+        """
+
+        log.debug(f"Event id '{post_id}' has been purged from WordPress")
+
+        self.known_post_ids.discard(post_id)
+        self.post_modified.pop(post_id, None)
+        self.unindex(post_id)
+        self.purged_post_ids[post_id] = datetime.now(tz=utc)
+        self.evict(post_id)
+
+        self.notify("purge", post_id)
+
+    def track_post_ids(self, post_ids: List[int], queried_post_ids: List[int] = None, complete: bool = False) -> None:
+        """
+            compare post ids returned by WordPress with all known post ids to detect purged events
+
+            Parameters
+            ----------
+            post_ids: list
+                post ids returned by DB query
+            queried_post_ids: list
+                the post ids which have been queried explicitly. Must not be set if the query
+                had any other condition (e.g. last update), as such posts exist without being returned
+            complete: bool
+                True if 'post_ids' contains all event post ids present in WordPress
+        """
+
+        post_ids = set(post_ids)
+
+        purged_post_ids = set()
+        if complete is True:
+            purged_post_ids = self.known_post_ids - post_ids
+        elif queried_post_ids is not None:
+            purged_post_ids = (set(queried_post_ids) - post_ids) & self.known_post_ids
+
+        for post_id in purged_post_ids:
+            self.purge(post_id)
+
+        for post_id in post_ids:
+            self.purged_post_ids.pop(post_id, None)
+
+        self.known_post_ids.update(post_ids)
+
+        if complete is True:
+            self.known_post_ids_synced = monotonic()
+        elif queried_post_ids is not None:
+            for post_id in set(queried_post_ids) - post_ids:
+                self.missing.set(post_id, True)
+
+    def is_missing(self, post_id: int) -> bool:
+        """
+            returns True if post id is known to not exist in WordPress, without querying the DB
+        """
+
+        if self.missing.get(post_id) is True:
+            return True
+
+        if self.known_post_ids_synced is not None and \
+                monotonic() - self.known_post_ids_synced < self.known_post_ids_ttl and \
+                post_id not in self.known_post_ids:
+            return True
+
+        return False
+
+    def get_purged_post_ids(self, since: datetime = None) -> Dict[int, datetime]:
+
+        return {k: v for k, v in self.purged_post_ids.items() if since is None or v > since}
+
+
+def get_event_store() -> Union[EventStore, None]:
+    global store
+    return store
+
+
+def setup_event_store(ttl: int = 3600, response_ttl: int = 300, negative_ttl: int = 60,
+                      cold_ttl: int = 86400, hot_weeks: int = 2, max_responses: int = 1000) -> EventStore:
+    global store
+    store = EventStore(ttl=ttl, response_ttl=response_ttl, negative_ttl=negative_ttl,
+                       cold_ttl=cold_ttl, hot_weeks=hot_weeks, max_responses=max_responses)
+    return store
+
+# EOF
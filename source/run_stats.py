@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Hashable, List, Tuple
+
+from api.models.run import Hash, HashStats, HashStatsCount
+from common.misc import split_quoted_string
+
+
+class RunStatistics:
+    """
+        aggregated statistics of all runs which are not deleted. Contributions of each run are
+        remembered, this way a run can be added again or removed without recalculating all aggregates.
+    """
+
+    aggregates = ["year", "kennel_name", "event_type", "hare", "event_attribute"]
+
+    # run attributes the aggregates are based on
+    fields = ["id", "start_date", "deleted", "kennel_name", "event_type", "hares", "event_attributes"]
+
+    def __init__(self) -> None:
+        self.counters: Dict[str, Counter] = {x: Counter() for x in self.aggregates}
+        self.contributions: Dict[int, List[Tuple[str, Hashable]]] = dict()
+
+    def __len__(self) -> int:
+        return len(self.contributions)
+
+    @staticmethod
+    def get_contributions(run: Hash) -> List[Tuple[str, Hashable]]:
+
+        contributions = list()
+
+        if isinstance(run.start_date, datetime):
+            contributions.append(("year", run.start_date.year))
+
+        contributions.append(("kennel_name", run.kennel_name))
+        contributions.append(("event_type", run.event_type))
+
+        for hare in split_quoted_string(run.hares, strip=True):
+            if isinstance(hare, str) and len(hare) > 0:
+                contributions.append(("hare", hare.strip("\"'")))
+
+        for event_attribute in run.event_attributes or list():
+            contributions.append(("event_attribute", getattr(event_attribute, "value", event_attribute)))
+
+        return contributions
+
+    def add(self, run: Hash) -> None:
+
+        self.remove(run.id)
+
+        if run.deleted is True:
+            return
+
+        contributions = self.get_contributions(run)
+        for aggregate, key in contributions:
+            self.counters[aggregate][key] += 1
+
+        self.contributions[run.id] = contributions
+
+    def remove(self, post_id: int) -> None:
+
+        for aggregate, key in self.contributions.pop(post_id, list()):
+            counter = self.counters[aggregate]
+            counter[key] -= 1
+            if counter[key] <= 0:
+                del counter[key]
+
+    def get_stats(self, num_hares: int = None) -> HashStats:
+        """
+            return current statistics, 'num_hares' limits the list of most frequent hares
+        """
+
+        return HashStats(
+            num_runs=len(self.contributions),
+            runs_per_year=dict(sorted(self.counters["year"].items())),
+            runs_per_kennel=dict(self.counters["kennel_name"].most_common()),
+            runs_per_type=dict(self.counters["event_type"].most_common()),
+            event_attributes=dict(self.counters["event_attribute"].most_common()),
+            hares=[HashStatsCount(name=name, count=count)
+                   for name, count in self.counters["hare"].most_common(num_hares)]
+        )
+
+# EOF
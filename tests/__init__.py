@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+"""
+    run with: python -m pytest tests
+
+    Benchmarks compare timings and memory usage against previous implementations. They depend on the load
+    of the machine and are skipped unless enabled with: BENCHMARK=true python -m pytest tests
+"""
+
+# EOF
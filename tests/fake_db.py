@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+"""
+    in memory WordPress database (SQLite) which behaves like a mysql-connector session
+    for the queries of source.database.DBConnection
+"""
+
+from datetime import datetime, timedelta
+import random
+import sqlite3
+from typing import Any, Dict, List, Tuple, Union
+
+from fastapi import FastAPI
+from phpserialize import dumps
+
+import config
+from api.routers import cache as cache_router, runs as runs_router
+from api.security import api_key_valid
+from config.models.app import AppSettings
+from config.models.calendar import CalendarConfigSettings
+import source.database as database
+import source.event_store as event_store
+
+schema = """
+    CREATE TABLE wp_posts (id INTEGER PRIMARY KEY, post_content TEXT, post_title TEXT, post_modified TIMESTAMP,
+                           post_modified_gmt TIMESTAMP, post_status TEXT, guid TEXT, post_type TEXT);
+    CREATE TABLE wp_postmeta (meta_id INTEGER PRIMARY KEY, post_id INT, meta_key TEXT, meta_value TEXT);
+    CREATE TABLE wp_options (option_id INTEGER PRIMARY KEY, option_name TEXT, option_value TEXT);
+    CREATE TABLE wp_terms (term_id INTEGER PRIMARY KEY, name TEXT);
+    CREATE TABLE wp_term_taxonomy (term_taxonomy_id INTEGER PRIMARY KEY, term_id INT, taxonomy TEXT);
+    CREATE TABLE wp_term_relationships (object_id INT, term_taxonomy_id INT,
+                                        PRIMARY KEY (object_id, term_taxonomy_id));
+    CREATE TABLE wp_users (id INTEGER PRIMARY KEY, display_name TEXT);
+    CREATE TABLE wp_usermeta (umeta_id INTEGER PRIMARY KEY, user_id INT, meta_key TEXT, meta_value TEXT);
+"""
+
+form_fields = {
+    "event": {
+        "event_banner": {"type": "file"},
+        "hash_kennel": {"type": "select", "options": {"nerd-h3": "Nerd H3", "nerd-full-moon-h3": "Nerd Full Moon H3"}},
+        "hash_attributes": {"type": "multiselect"},
+        "event_timezone": {"type": "timezone"}
+    }
+}
+
+# connecting to MySQL is disabled once the fake DB is set up
+mysql_init_session = database.DBConnection.init_session
+
+first_start_date = datetime(2020, 1, 1, 18, 0, 0)
+last_modified = datetime(2024, 6, 1, 12, 0, 0)
+
+
+class FakeCursor:
+
+    def __init__(self, session: "FakeSession", dictionary: bool = False, buffered: bool = True) -> None:
+        self.session = session
+        self.cursor = session.db.cursor()
+        self.dictionary = dictionary
+        self.buffered = buffered
+        self.rowcount = 0
+
+    def execute(self, query: str, params: Tuple = None) -> None:
+
+        # like MySQL, the session can't run a query while an unbuffered result has not been read
+        if self.session.unread_result is True:
+            raise AssertionError("session has unread result of an unbuffered query")
+
+        self.session.queries.append(query)
+        self.cursor.execute(query.replace("%s", "?"), params or ())
+        self.rowcount = self.cursor.rowcount
+        self.session.unread_result = self.buffered is False and self.cursor.description is not None
+
+    def convert(self, row: tuple) -> Union[Dict[str, Any], tuple]:
+        if self.dictionary is True:
+            return {column[0]: value for column, value in zip(self.cursor.description, row)}
+        return row
+
+    def fetchall(self) -> List:
+        self.session.unread_result = False
+        return [self.convert(x) for x in self.cursor.fetchall()]
+
+    def fetchmany(self, size: int = 1) -> List:
+        rows = self.cursor.fetchmany(size)
+        if len(rows) == 0:
+            self.session.unread_result = False
+        return [self.convert(x) for x in rows]
+
+    def close(self) -> None:
+        pass
+
+
+class FakeSession:
+
+    autocommit = True
+
+    def __init__(self) -> None:
+        self.db = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        self.db.executescript(schema)
+        self.unread_result = False
+        self.queries: List[str] = list()
+
+    def is_connected(self) -> bool:
+        return True
+
+    def cursor(self, dictionary: bool = False, buffered: bool = True) -> FakeCursor:
+        return FakeCursor(self, dictionary=dictionary, buffered=buffered is not False)
+
+    def consume_results(self) -> None:
+        self.unread_result = False
+
+    def commit(self) -> None:
+        self.db.commit()
+
+    def close(self) -> None:
+        pass
+
+
+def add_event(db: sqlite3.Connection, post_id: int, **meta) -> None:
+    """
+        add an event post with a deterministic set of meta data, 'meta' overrides single meta values
+    """
+
+    rand = random.Random(post_id)
+    start_date = first_start_date + timedelta(weeks=post_id * 4)
+    modified = last_modified - timedelta(hours=post_id)
+
+    db.execute("INSERT INTO wp_posts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+               (post_id, f"<p>Run {post_id} description with beer</p>", f"Nerd H3 Run #{post_id}", modified,
+                modified - timedelta(hours=2), "publish" if post_id % 7 else "trash",
+                f"https://example.com/?p={post_id}", "event_listing" if post_id % 10 else "post"))
+
+    post_meta = {
+        "_event_start_date": start_date.strftime("%Y-%m-%d %H:%M:%S"),
+        "_event_end_date": (start_date + timedelta(hours=2)).strftime("%Y-%m-%d %H:%M:%S") if post_id % 3 else "",
+        "_event_timezone": "Europe/Berlin",
+        "_hash_run_number": str(post_id),
+        "_hash_hares": rand.choice(["Alpha, Beta", "Gamma", "\"Delta, Jr\", Eps"]),
+        "_event_location": rand.choice(["Berlin Pub", "Park", "Station"]),
+        "_cancelled": "0" if post_id % 5 else "1",
+        "_hash_kennel": rand.choice(["nerd-h3", "nerd-full-moon-h3"]),
+        "_hash_scope": "promote-locally",
+        "_hash_attributes": dumps({0: "city-run", 1: "on-after"} if post_id % 2 else {0: "walker-trail"}).decode(),
+        "_hash_cash": "5",
+        "_event_banner": dumps({0: "https://example.com/banner.png"}).decode()
+    }
+
+    if post_id % 4 == 0:
+        post_meta["_hash_geo_map_url"] = "https://www.openstreetmap.org/#map=15/52.4512/13.4471"
+    elif post_id % 4 == 1:
+        post_meta["geolocation_lat"] = "52.1"
+        post_meta["geolocation_long"] = "13.2"
+
+    post_meta.update(meta)
+
+    for meta_key, meta_value in post_meta.items():
+        db.execute("INSERT INTO wp_postmeta (post_id, meta_key, meta_value) VALUES (?, ?, ?)",
+                   (post_id, meta_key, meta_value))
+
+    db.execute("INSERT INTO wp_term_relationships VALUES (?, ?)", (post_id, 1 if post_id % 2 else 2))
+
+
+def setup_fake_db(num_posts: int = 60) -> FakeSession:
+    """
+        set up DB handler with a fake session containing 'num_posts' posts
+    """
+
+    session = FakeSession()
+    db = session.db
+
+    db.execute("INSERT INTO wp_options (option_name, option_value) VALUES (?, ?)",
+               ("event_manager_submit_event_form_fields", dumps(form_fields).decode()))
+    db.execute("INSERT INTO wp_terms VALUES (1, 'Regular Run'), (2, 'Full Moon Run'), (3, 'News')")
+    db.execute("INSERT INTO wp_term_taxonomy VALUES (1, 1, 'event_listing_type'), (2, 2, 'event_listing_type'), "
+               "(3, 3, 'category')")
+
+    for post_id in range(1, num_posts + 1):
+        add_event(db, post_id)
+
+    session.commit()
+
+    database.DBConnection.init_session = lambda self: None
+    database.DBConnection.copy = lambda self: self
+    database.setup_db_handler("localhost", "user", "password", "wordpress").session = session
+
+    config.app_settings = AppSettings(hash_kennels="Nerd H3, Nerd Full Moon H3", timezone_string="Europe/Berlin")
+    config.calendar_settings = CalendarConfigSettings()
+
+    return session
+
+
+def get_test_app(cache: bool = True) -> FastAPI:
+    """
+        return app with runs and cache routes, with a new event store if 'cache' is True
+    """
+
+    if cache is True:
+        event_store.setup_event_store()
+    else:
+        event_store.store = None
+
+    app = FastAPI()
+    app.dependency_overrides[api_key_valid] = lambda: None
+    app.include_router(runs_router.router_runs)
+    app.include_router(cache_router.router_cache)
+
+    return app
+
+# EOF
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+"""
+    binlog rows are read in a separate thread and have to be applied to the event store within the event loop
+"""
+
+import asyncio
+from threading import Thread, get_ident
+import unittest
+
+from fastapi.testclient import TestClient
+
+from config.models.binlog import BinlogConfigSettings
+from config.models.database import DBSettings
+from source.binlog import BinlogConsumer
+import source.event_store as event_store
+from tests.fake_db import setup_fake_db, get_test_app
+
+
+class TestBinlogConsumer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        setup_fake_db(20)
+        self.client = TestClient(get_test_app(cache=True))
+        self.client.get("/runs/all")
+
+        self.store = event_store.get_event_store()
+        self.loop = asyncio.new_event_loop()
+        self.consumer = BinlogConsumer(BinlogConfigSettings(),
+                                       DBSettings(username="user", password="password", name="wordpress",
+                                                  host="localhost"))
+        self.consumer.loop = self.loop
+
+        self.evicted = list()
+        self.store.subscribe(lambda action, post_id: self.evicted.append((action, post_id, get_ident())))
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    def consume(self, table: str, values: dict, deleted: bool = False) -> None:
+        """
+            pass row to consumer from another thread and run the event loop until it has been applied
+        """
+        thread = Thread(target=self.consumer.handle_row, args=(table, values, deleted))
+        thread.start()
+        thread.join()
+
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+
+    def test_changes_applied_in_event_loop(self):
+
+        self.consume("wp_posts", {"ID": 3, "post_type": "event_listing"})
+
+        self.assertEqual([("evict", 3, get_ident())], self.evicted)
+        self.assertIsNone(self.store.get(3))
+
+    def test_meta_data_of_other_posts_ignored(self):
+
+        self.store.responses.set(("all",), b"[]")
+
+        # post 10 is not an event
+        self.consume("wp_postmeta", {"post_id": 10, "meta_key": "_hash_run_number"})
+        self.consume("wp_postmeta", {"post_id": 3, "meta_key": "_edit_lock"})
+
+        self.assertEqual([], self.evicted)
+        self.assertEqual(b"[]", self.store.responses.get(("all",)))
+
+        self.consume("wp_postmeta", {"post_id": 3, "meta_key": "_hash_run_number"})
+
+        self.assertEqual([("evict", 3, get_ident())], self.evicted)
+        self.assertIsNone(self.store.responses.get(("all",)))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# EOF
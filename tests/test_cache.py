@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+import unittest
+from unittest import mock
+
+from common import cache
+from common.cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+
+        store = TTLCache(ttl=300, max_size=2)
+        store.set("a", 1)
+        store.set("b", 2)
+        self.assertEqual(store.get("a"), 1)
+
+        store.set("c", 3)
+
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.get("b"))
+        self.assertEqual(store.get("a"), 1)
+        self.assertEqual(store.get("c"), 3)
+
+    def test_sweeps_expired_entries(self):
+
+        now = [1000.0]
+        with mock.patch.object(cache, "monotonic", lambda: now[0]):
+            store = TTLCache(ttl=10)
+            for key in range(5):
+                store.set(key, key)
+
+            now[0] += 11
+            store.set("fresh", True)
+
+            self.assertEqual(list(store.data), ["fresh"])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# EOF
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+import os
+import tracemalloc
+from typing import Callable, List
+import unittest
+
+from tests.fake_db import setup_fake_db
+from source.database import get_db_handler, PostMeta
+
+
+class TestQueryPlanStatistics(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.session = setup_fake_db(30)
+        self.conn = get_db_handler()
+
+    def count_queries(self, pattern: str) -> int:
+        return len([x for x in self.session.queries if pattern in x])
+
+    def test_statistics_cached(self):
+
+        conditions = {"_hash_run_number": lambda x: x == "12"}
+
+        for _ in range(3):
+            plan = self.conn.plan_posts_query(conditions)
+            self.assertEqual("meta_first", plan.strategy)
+            self.assertEqual(27, plan.total_rows)
+
+        self.assertEqual(1, self.count_queries("MAX(post_modified_gmt)"))
+        self.assertEqual(1, self.count_queries("GROUP BY m.meta_value"))
+
+    def test_statistics_queried_again_once_cleared(self):
+
+        self.conn.get_posts_statistics()
+        self.conn.statistics.clear()
+        self.conn.get_posts_statistics()
+
+        self.assertEqual(2, self.count_queries("MAX(post_modified_gmt)"))
+
+
+class TestEventTypes(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.session = setup_fake_db(10)
+        self.conn = get_db_handler()
+
+    def count_queries(self, pattern: str) -> int:
+        return len([x for x in self.session.queries if pattern in x])
+
+    def test_event_type_resolved_from_relationship(self):
+
+        # posts are also assigned to terms of other taxonomies
+        self.session.db.execute("INSERT INTO wp_term_relationships VALUES (5, 3)")
+
+        posts = self.conn.get_posts()
+
+        self.assertEqual(9, len(posts))
+        self.assertEqual({x.get("id"): "Regular Run" if x.get("id") % 2 else "Full Moon Run" for x in posts},
+                         {x.get("id"): x.get("post_type") for x in posts})
+
+        self.session.db.execute("DELETE FROM wp_term_relationships WHERE object_id = 6")
+        self.assertIsNone(self.conn.get_posts(post_id=6)[0].get("post_type"))
+
+    def test_term_map_cached(self):
+
+        for _ in range(3):
+            self.conn.get_posts()
+            self.conn.get_post_with_meta(3)
+
+        self.assertEqual(1, self.count_queries("wp_tax.taxonomy = %s"))
+
+    def test_term_map_reloaded_for_new_event_type(self):
+
+        self.conn.get_posts()
+
+        self.session.db.execute("INSERT INTO wp_terms VALUES (4, 'Hash Bash')")
+        self.session.db.execute("INSERT INTO wp_term_taxonomy VALUES (4, 4, 'event_listing_type')")
+        self.session.db.execute("UPDATE wp_term_relationships SET term_taxonomy_id = 4 WHERE object_id = 6")
+
+        self.assertEqual("Hash Bash", self.conn.get_posts(post_id=6)[0].get("post_type"))
+        self.assertEqual(2, self.count_queries("wp_tax.taxonomy = %s"))
+
+
+posts_meta_query = "SELECT `post_id`, `meta_key`, `meta_value` FROM `wp_postmeta` ORDER BY `post_id` DESC, `meta_id` ASC"
+
+
+def peak_allocation(func: Callable[[], List]) -> int:
+    """
+        peak of memory allocated in bytes while 'func' is called and its result is held
+    """
+
+    tracemalloc.start()
+    try:
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+        del result
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+
+class TestPostMetaRecords(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.session = setup_fake_db(20)
+        self.conn = get_db_handler()
+
+    def test_identical_to_dict_rows(self):
+
+        rows = list(self.conn.stream_select_query(posts_meta_query))
+        records = list(self.conn.get_posts_meta(stream=True))
+
+        self.assertTrue(all(isinstance(x, PostMeta) for x in records))
+        self.assertEqual([(x.get("post_id"), x.get("meta_key"), x.get("meta_value")) for x in rows],
+                         [(x.post_id, x.meta_key, x.meta_value) for x in records])
+
+    def test_meta_keys_interned(self):
+
+        records = [x for x in self.conn.get_posts_meta(stream=True) if x.meta_key == "_hash_run_number"]
+
+        self.assertEqual(20, len(records))
+        self.assertEqual(1, len({id(x.meta_key) for x in records}))
+
+
+@unittest.skipUnless(os.environ.get("BENCHMARK") == "true", "benchmarks only run with BENCHMARK=true")
+class BenchmarkPostMetaRecords(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.session = setup_fake_db(2000)
+        self.conn = get_db_handler()
+
+    def test_peak_allocation(self):
+        """
+            hold the meta data of 2k events as dict rows and as PostMeta records
+        """
+
+        previous = peak_allocation(lambda: list(self.conn.stream_select_query(posts_meta_query)))
+        current = peak_allocation(lambda: list(self.conn.get_posts_meta(stream=True)))
+
+        self.assertLess(current, previous * 0.75, f"meta data of 2k events: dict rows {previous / 1024:.0f} KiB, "
+                                                  f"PostMeta records {current / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# EOF
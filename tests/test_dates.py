@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from datetime import datetime
+import os
+from timeit import repeat
+from typing import List
+import unittest
+
+from pydantic import BaseModel
+import pytz
+
+from common.dates import date_time_format, get_timezone, parse_date_time
+
+time_zone_name = "Europe/Berlin"
+
+
+class ParsedDate(BaseModel):
+    value: datetime
+
+
+def parse_date_time_previous(value: str) -> datetime:
+    """
+        date parsing before dates have been normalized once: validated with strptime, parsed again
+        by pydantic and localized with a time zone which got looked up for every event
+    """
+
+    datetime.strptime(value, date_time_format)
+
+    return pytz.timezone(time_zone_name).localize(ParsedDate(value=value).value)
+
+
+def benchmark_values() -> List[str]:
+    return [f"20{10 + i % 15:02d}-{1 + i % 12:02d}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:00"
+            for i in range(10000)]
+
+
+class TestParseDateTime(unittest.TestCase):
+
+    def test_identical_to_strptime(self):
+
+        time_zone = get_timezone(time_zone_name)
+
+        values = [
+            "2022-06-01 18:30:00",
+            "2022-12-31 23:59:59",
+            "2021-03-28 02:30:00",  # does not exist, clocks are set forward
+            "2021-10-31 02:30:00",  # ambiguous, clocks are set back
+            "2022-6-1 8:05:00",  # not zero padded
+            "2024-02-29 00:00:00"
+        ]
+
+        for value in values:
+            with self.subTest(value=value):
+                expected = time_zone.localize(datetime.strptime(value, date_time_format))
+                parsed = parse_date_time(value, time_zone)
+
+                self.assertEqual(expected, parsed)
+                self.assertEqual(expected.utcoffset(), parsed.utcoffset())
+
+        self.assertEqual(datetime(2022, 6, 1, 18, 30), parse_date_time("2022-06-01 18:30:00"))
+
+    def test_invalid_values(self):
+
+        for value in [None, "", "2022-06-01", "2022-06-01T18:30:00", "2022-13-01 18:30:00", "2023-02-29 00:00:00",
+                      "2022-06-01 18:30:00+02", "2024-01-01 18:00+01", "2024-01-01 18+01:00", "yesterday",
+                      1654101000]:
+            with self.subTest(value=value):
+                self.assertIsNone(parse_date_time(value, get_timezone(time_zone_name)))
+
+    def test_timezone_looked_up_once(self):
+
+        self.assertIs(get_timezone(time_zone_name), get_timezone(time_zone_name))
+
+        with self.assertRaises(pytz.UnknownTimeZoneError):
+            get_timezone("Europe/Nowhere")
+
+    def test_identical_to_previous(self):
+
+        for value in benchmark_values()[:100]:
+            self.assertEqual(parse_date_time_previous(value), parse_date_time(value, get_timezone(time_zone_name)))
+
+
+@unittest.skipUnless(os.environ.get("BENCHMARK") == "true", "benchmarks only run with BENCHMARK=true")
+class BenchmarkParseDateTime(unittest.TestCase):
+
+    def test_parse_event_dates(self):
+        """
+            parse start dates of 10k events
+        """
+
+        values = benchmark_values()
+
+        previous = min(repeat(lambda: [parse_date_time_previous(x) for x in values], number=1, repeat=3))
+        current = min(repeat(lambda: [parse_date_time(x, get_timezone(time_zone_name)) for x in values],
+                             number=1, repeat=3))
+
+        self.assertLess(current, previous, f"10k event dates: previous {previous * 1000:.1f} ms, "
+                                           f"current {current * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# EOF
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+from datetime import datetime, timedelta
+import gzip
+import json
+import unittest
+
+from fastapi.testclient import TestClient
+import pytz
+
+from api.factory.runs import get_hash_run
+from common.misc import dump_json
+import source.event_store as event_store
+from tests.fake_db import setup_fake_db, get_test_app, last_modified, first_start_date
+
+
+class TestHotColdPartition(unittest.TestCase):
+
+    # runs start every four weeks from 2020, the last ones are upcoming runs
+    hot_post_id = 119
+    cold_post_id = 3
+
+    def setUp(self) -> None:
+        setup_fake_db(120)
+        self.client = TestClient(get_test_app(cache=True))
+        self.store = event_store.get_event_store()
+
+    def test_hot_runs_serialized_when_stored(self):
+
+        hot_run = get_hash_run(self.hot_post_id)
+        cold_run = get_hash_run(self.cold_post_id)
+
+        self.assertTrue(self.store.is_hot(hot_run))
+        self.assertFalse(self.store.is_hot(cold_run))
+
+        self.assertEqual((hot_run.last_update, dump_json(hot_run)), self.store.fragments.get(self.hot_post_id))
+        self.assertIsNone(self.store.fragments.get(self.cold_post_id))
+
+    def test_cold_runs_serialized_on_demand(self):
+
+        response = self.client.get(f"/runs/{self.cold_post_id}")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(response.content, self.store.fragments.get(self.cold_post_id)[1])
+        self.assertEqual(response.content, self.client.get(f"/runs/{self.cold_post_id}").content)
+
+
+class TestUnparsablePosts(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.session = setup_fake_db(20)
+        self.client = TestClient(get_test_app(cache=True))
+        self.store = event_store.get_event_store()
+
+    def break_post(self, post_id: int) -> None:
+        """
+            remove start date of a post, which can't be parsed as event afterwards, and evict it
+        """
+        self.session.db.execute("DELETE FROM wp_postmeta WHERE post_id = ? AND meta_key = '_event_start_date'",
+                                (post_id,))
+        self.session.db.execute("UPDATE wp_posts SET post_modified = ? WHERE id = ?",
+                                (last_modified + timedelta(days=1), post_id))
+        self.store.evict(post_id)
+
+    def assert_unindexed(self, post_id: int) -> None:
+        self.assertNotIn(post_id, self.store.post_modified)
+        self.assertIsNone(self.store.events.get(post_id))
+        self.assertEqual([], self.store.range_indexes["run_number"].equal(post_id))
+        self.assertNotIn(post_id, self.store.stats.contributions)
+
+    def test_listing_unindexes_post(self):
+
+        num_runs = len(self.client.get("/runs/all").json())
+        self.assertIn(3, self.store.post_modified)
+
+        self.break_post(3)
+
+        self.assertEqual(num_runs - 1, len(self.client.get("/runs/all").json()))
+        self.assert_unindexed(3)
+        self.assertEqual([], self.client.get("/runs/all?run_number=3").json())
+
+    def test_single_run_unindexes_post(self):
+
+        self.assertEqual(200, self.client.get("/runs/3").status_code)
+
+        self.break_post(3)
+
+        self.assertEqual(404, self.client.get("/runs/3").status_code)
+        self.assert_unindexed(3)
+
+
+class TestMultipleEventTypes(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.session = setup_fake_db(20)
+        self.session.db.execute("INSERT INTO wp_terms VALUES (4, 'Hash Bash')")
+        self.session.db.execute("INSERT INTO wp_term_taxonomy VALUES (4, 4, 'event_listing_type')")
+        self.session.db.execute("INSERT INTO wp_term_relationships VALUES (3, 4)")
+        self.client = TestClient(get_test_app(cache=True))
+        self.store = event_store.get_event_store()
+
+    def test_run_stored_once(self):
+
+        run_ids = [x.get("id") for x in self.client.get("/runs/all").json()]
+
+        self.assertEqual(len(set(run_ids)), len(run_ids))
+        self.assertIn(3, run_ids)
+        self.assertIsNotNone(self.store.get(3))
+        self.assertTrue(self.store.snapshot_valid())
+
+
+class TestPurgeDetection(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.session = setup_fake_db(200)
+        self.client = TestClient(get_test_app(cache=True))
+        self.store = event_store.get_event_store()
+
+        # all post ids are known, snapshot is outdated
+        self.client.get("/runs/all")
+        self.store.evict(1)
+
+    def assert_not_purged(self, post_ids: list) -> None:
+        self.assertEqual(dict(), self.store.get_purged_post_ids())
+        for post_id in post_ids:
+            self.assertEqual(200, self.client.get(f"/runs/{post_id}").status_code)
+
+    def test_planner_candidates_not_purged(self):
+
+        start_date = pytz.timezone("Europe/Berlin").localize(first_start_date + timedelta(weeks=195 * 4))
+
+        # calendar filters by last update, selective start date is resolved via meta data first
+        response = self.client.get(f"/runs/calendar?start_date__gt={int(start_date.timestamp())}")
+
+        self.assertEqual(200, response.status_code)
+        self.assert_not_purged(range(195, 200))
+
+    def test_ids_filtered_by_last_update_not_purged(self):
+
+        response = self.client.get("/runs/all?id=5&last_update__gt=1900000000")
+
+        self.assertEqual([], response.json())
+        self.assert_not_purged([5])
+
+    def test_missing_ids_purged(self):
+
+        self.client.get("/runs/all?id=5")
+        self.assertEqual(dict(), self.store.get_purged_post_ids())
+
+        self.session.db.execute("DELETE FROM wp_posts WHERE id = 5")
+        self.store.evict(5)
+
+        self.assertEqual([], self.client.get("/runs/all?id=5").json())
+        self.assertEqual([5], list(self.store.get_purged_post_ids()))
+
+
+class TestChangeFeed(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.session = setup_fake_db(20)
+        self.client = TestClient(get_test_app(cache=True))
+
+    def test_changes_not_served_from_snapshot(self):
+
+        self.client.get("/runs/all")
+        cursor = self.client.get("/runs/changes?since=0").json().get("cursor")
+        self.assertIsNotNone(event_store.get_event_store().get_snapshot())
+
+        # edited without the event store being notified (no binlog consumer)
+        now = datetime.utcnow().replace(microsecond=0)
+        self.session.db.execute("UPDATE wp_posts SET post_modified = ?, post_modified_gmt = ? WHERE id = 3",
+                                (now + timedelta(hours=2), now + timedelta(seconds=1)))
+
+        changes = self.client.get(f"/runs/changes?since={cursor}").json()
+        self.assertEqual([3], [x.get("id") for x in changes.get("changes")])
+
+        export = gzip.decompress(self.client.get(f"/runs/export?since={cursor}").content).splitlines()
+        self.assertEqual([3], [json.loads(x).get("id") for x in export])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# EOF
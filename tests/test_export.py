@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+"""
+    exports and listings read posts page by page, results must not depend on the page size
+"""
+
+import gzip
+import json
+import unittest
+
+from fastapi.testclient import TestClient
+
+import source.database as database
+from tests.fake_db import setup_fake_db, get_test_app
+
+
+class TestPagedExport(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.session = setup_fake_db(60)
+        self.posts_page_size = database.DBConnection.posts_page_size
+
+        # record number of posts each content query is fetching
+        self.content_batches = list()
+        get_posts_content = database.DBConnection.get_posts_content
+
+        def spy(conn, post_ids):
+            self.content_batches.append(len(post_ids))
+            return get_posts_content(conn, post_ids)
+
+        database.DBConnection.get_posts_content = spy
+        self.addCleanup(setattr, database.DBConnection, "get_posts_content", get_posts_content)
+
+    def tearDown(self) -> None:
+        database.DBConnection.posts_page_size = self.posts_page_size
+
+    def export(self, client: TestClient) -> list:
+        response = client.get("/runs/export?format=ndjson")
+        self.assertEqual(200, response.status_code)
+        return [json.loads(x) for x in gzip.decompress(response.content).decode("utf-8").splitlines()]
+
+    def test_export_in_pages(self):
+
+        for cache in [False, True]:
+            with self.subTest(cache=cache):
+                database.DBConnection.posts_page_size = self.posts_page_size
+                expected = self.export(TestClient(get_test_app(cache=cache)))
+
+                database.DBConnection.posts_page_size = 7
+                self.content_batches.clear()
+                runs = self.export(TestClient(get_test_app(cache=cache)))
+
+                self.assertEqual(expected, runs)
+                self.assertGreater(len(self.content_batches), 1)
+                self.assertLessEqual(max(self.content_batches), 7)
+
+    def test_listing_in_pages(self):
+
+        queries = ["/runs/all", "/runs/all?limit=3", "/runs/all?run_number__gt=20&kennel_name=moon",
+                   "/runs/all?q=gamma", "/runs/stats"]
+
+        for cache in [False, True]:
+            with self.subTest(cache=cache):
+                database.DBConnection.posts_page_size = self.posts_page_size
+                client = TestClient(get_test_app(cache=cache))
+                expected = [client.get(x).json() for x in queries]
+
+                database.DBConnection.posts_page_size = 7
+                client = TestClient(get_test_app(cache=cache))
+                self.assertEqual(expected, [client.get(x).json() for x in queries])
+
+    def test_limited_listing_fetches_content_of_first_page(self):
+
+        client = TestClient(get_test_app(cache=True))
+        self.assertEqual(3, len(client.get("/runs/all?limit=3").json()))
+        self.assertEqual([3], self.content_batches)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# EOF
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+"""
+    compiled filter params need to match exactly the same runs as the filter evaluation they replaced
+"""
+
+from itertools import combinations
+import unittest
+
+from api.models.run import Hash, HashParams, HashScope
+from api.factory.runs import compile_filter_params, get_hash_runs
+import source.event_store as event_store
+from api.models.exceptions import RequestValidationError
+from tests.fake_db import setup_fake_db
+from tests.test_run_parity import run_22_start
+
+filters = [
+    {"run_number": 12},
+    {"run_number__gt": 22},
+    {"run_number__lt": 22},
+    {"start_date": run_22_start},
+    {"start_date__gt": run_22_start},
+    {"start_date__lt": run_22_start},
+    {"event_name": "RUN #1"},
+    {"kennel_name": "moon"},
+    {"event_type": "full"},
+    {"event_attributes": "walker-trail"},
+    {"event_geographic_scope": "promote-locally"},
+    {"event_geographic_scope": "promote-regionally"},
+    {"deleted": True},
+    {"deleted": False},
+    {"run_is_counted": True},
+    {"hares": "jr"},
+    {"location_name": "PUB"},
+    {"last_update__gt": 1600000000},
+    {"limit": 3}
+]
+
+
+def passes_filter_params_previous(params: HashParams, hash_event: Hash) -> bool:
+    """
+        filter evaluation before filter params got compiled, 'q', 'near' and 'radius_km' have been added
+        later and are resolved separately
+    """
+
+    def compare_attributes(value_a, value_b):
+
+        if type(value_a) == type(value_b):
+            if "__gt" in key and value_b > value_a:
+                return True
+            elif "__lt" in key and value_b < value_a:
+                return True
+            elif value_b == value_a:
+                return True
+
+        return False
+
+    matches = list()
+    for key, value in params.dict().items():
+
+        if key.startswith("__"):
+            continue
+
+        if value is None or key in ["id", "limit", "q", "near", "radius_km"]:
+            continue
+
+        if key.startswith("last_update"):
+            continue
+
+        event_value = getattr(hash_event, key, None)
+        if type(value) == type(event_value) == str and value.lower() in event_value.lower():
+            matches.append(True)
+            continue
+
+        if type(value) == type(event_value) == bool and value == event_value:
+            matches.append(True)
+            continue
+
+        if type(value) == HashScope and value == event_value:
+            matches.append(True)
+            continue
+
+        if key.startswith("start_date") and compare_attributes(value, getattr(hash_event, "start_date")):
+            matches.append(True)
+            continue
+
+        if key.startswith("run_number") and compare_attributes(value, getattr(hash_event, "run_number")):
+            matches.append(True)
+            continue
+
+        matches.append(False)
+
+    return False if False in matches else True
+
+
+class TestCompiledFilterParams(unittest.TestCase):
+
+    def setUp(self) -> None:
+        setup_fake_db(60)
+        event_store.store = None
+
+        # noinspection PyArgumentList
+        self.runs = get_hash_runs(HashParams())
+
+    def test_parity_with_previous_filter(self):
+
+        self.assertEqual(54, len(self.runs))
+
+        filter_combinations = [x for x in filters] + [{**a, **b} for a, b in combinations(filters, 2)]
+
+        for filter_params in filter_combinations:
+            with self.subTest(params=filter_params):
+                try:
+                    params = HashParams(**filter_params)
+                except RequestValidationError:
+                    # e.g. 'run_number' and 'run_number__gt' are mutual exclusive
+                    continue
+
+                passes = compile_filter_params(params)
+
+                expected = [x.id for x in self.runs if passes_filter_params_previous(params, x) is True]
+                self.assertEqual(expected, [x.id for x in self.runs if passes(x) is True])
+
+    def test_boundaries_included(self):
+
+        for filter_params in [{"run_number__gt": 22}, {"run_number__lt": 22},
+                              {"start_date__gt": run_22_start}, {"start_date__lt": run_22_start}]:
+            with self.subTest(params=filter_params):
+                passes = compile_filter_params(HashParams(**filter_params))
+                self.assertIn(22, [x.run_number for x in self.runs if passes(x) is True])
+
+if __name__ == "__main__":
+    unittest.main()
+
+# EOF
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+import os
+import re
+from timeit import repeat
+import unittest
+
+from common.map_url import parse_map_url, parsed_map_urls
+
+map_urls = {
+    "https://www.openstreetmap.org/#map=15/52.4512/13.4471": (52.4512, 13.4471),
+    "https://www.openstreetmap.org/?mlat=52.4811867&mlon=13.525649": (52.4811867, 13.525649),
+    "https://www.openstreetmap.org/?mlat=52.48&mlon=13.52#map=17/52.4811867/13.525649": (52.4811867, 13.525649),
+    "https://www.google.com/maps/place/Berlin/@52.50,13.14,10z/data=!3m1!4b1!4m6!3m5!1s0x0:0x0!8m2!3d52.52!4d13.40":
+        (52.52, 13.40),
+    "https://www.google.com/maps/@52.4512,-13.4471,15z": (52.4512, -13.4471),
+    "https://maps.google.com/?q=52.4512,13.4471": (52.4512, 13.4471),
+    "https://maps.apple.com/?ll=52.4512,13.4471&q=Pin": (52.4512, 13.4471),
+    "https://maps.apple.com/?q=Berlin": None,
+    "https://goo.gl/maps/abcdef": None,
+    "https://example.com/?q=52.4512,13.4471": None,
+    "": None
+}
+
+benchmark_url_templates = [
+    "https://www.openstreetmap.org/#map=15/52.4512/13.{}",
+    "https://www.google.com/maps/place/X/@52.50,13.14,10z/data=!3m1!8m2!3d52.52!4d13.{}",
+    "https://example.com/location/{}"
+]
+
+
+def parse_map_url_previous(url: str):
+    """
+        map link parsing before the map url resolver has been added, used as benchmark baseline
+    """
+
+    pattern = r"#map=\d+/(?P<latitude>[-]?\d+\.\d+)/(?P<longitude>[-]?\d+\.\d+)"
+    if "google" in url:
+        pattern = r".*\!3d(?P<latitude>[-]?\d+\.\d+)\!4d(?P<longitude>[-]?\d+\.\d+).*"
+
+    match = re.search(pattern, url)
+    if match:
+        return float(match.group("latitude")), float(match.group("longitude"))
+
+
+class TestMapUrl(unittest.TestCase):
+
+    def test_parse_map_url(self):
+
+        for url, coordinates in map_urls.items():
+            with self.subTest(url=url):
+                self.assertEqual(coordinates, parse_map_url(url))
+
+        self.assertIsNone(parse_map_url(None))
+
+    def test_parse_identical_to_previous(self):
+
+        for url in [x.format(12345) for x in benchmark_url_templates]:
+            with self.subTest(url=url):
+                self.assertEqual(parse_map_url_previous(url), parse_map_url(url))
+
+
+@unittest.skipUnless(os.environ.get("BENCHMARK") == "true", "benchmarks only run with BENCHMARK=true")
+class BenchmarkMapUrl(unittest.TestCase):
+
+    def test_distinct_links(self):
+        """
+            links which are all distinct don't benefit from memoization, parsing them must not get
+            slower than before for the link formats which have been supported previously
+        """
+
+        urls = [benchmark_url_templates[i % len(benchmark_url_templates)].format(i) for i in range(10000)]
+
+        def parse_all():
+            parsed_map_urls.clear()
+            for x in urls:
+                parse_map_url(x)
+
+        # measure alternately, so both are affected by load of the test runner alike
+        timings = [(repeat(lambda: [parse_map_url_previous(x) for x in urls], number=1, repeat=1)[0],
+                    repeat(parse_all, number=1, repeat=1)[0]) for _ in range(9)]
+        previous = min([x for x, _ in timings])
+        current = min([x for _, x in timings])
+
+        self.assertLess(current, previous, f"10k distinct map links: previous {previous * 1000:.1f} ms, "
+                                           f"current {current * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    unittest.main()
+
+# EOF
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+"""
+    tests which need a MySQL database with WordPress and the Event Manager plugin installed.
+    They are skipped unless the database is configured via environment variables the same way as for the
+    API itself (DATABASE_HOST, DATABASE_PORT, DATABASE_USERNAME, DATABASE_PASSWORD, DATABASE_NAME).
+
+    The query plan tests add a few event posts, terms and term relationships and remove them afterwards.
+
+    The binlog consumer test additionally needs 'BINLOG_ENABLED=true' (see config section 'binlog'), it
+    adds and removes a meta data entry of an event. Only run it against a local test database.
+"""
+
+import asyncio
+from datetime import datetime
+import os
+from typing import List, Tuple
+import unittest
+from unittest import mock
+
+from config.models.binlog import BinlogConfigSettings
+from config.models.database import DBSettings
+from source import binlog
+from source.database import DBConnection
+import source.event_store as event_store
+from tests.fake_db import mysql_init_session
+
+
+def get_mysql_connection() -> DBConnection:
+    """
+        return connection to the MySQL database configured via environment variables
+    """
+
+    settings = DBSettings()
+    with mock.patch.object(DBConnection, "init_session", mysql_init_session):
+        return DBConnection(settings.host, settings.username, settings.password, settings.name, settings.port)
+
+
+@unittest.skipIf(os.environ.get("DATABASE_HOST") is None, "no MySQL database configured")
+class TestMySQLQueryPlans(unittest.TestCase):
+
+    # aliases of the tables used to look up the event type of a post
+    term_tables = ["t", "tax"]
+    title = "hash-api-query-plan-test"
+    num_posts = 5
+
+    def setUp(self) -> None:
+        self.conn = get_mysql_connection()
+
+        if self.conn.session is None:
+            self.skipTest("unable to connect to MySQL database")
+
+        self.post_ids: List[int] = list()
+        self.term_ids: List[int] = list()
+        self.seed()
+
+        self.queries: List[str] = list()
+        execute_select_query = self.conn.execute_select_query
+
+        def record_query(query, params=None):
+            self.queries.append(query)
+            return execute_select_query(query, params)
+
+        self.conn.execute_select_query = record_query
+
+    def tearDown(self) -> None:
+        self.remove_seed()
+        self.conn.close()
+
+    def insert(self, query: str, params: Tuple) -> int:
+        cursor = self.conn.session.cursor()
+        cursor.execute(query, params)
+        row_id = cursor.lastrowid
+        cursor.close()
+        return row_id
+
+    def add_term(self, name: str, taxonomy: str) -> int:
+
+        term_id = self.insert("INSERT INTO wp_terms (name, slug, term_group) VALUES (%s, %s, 0)",
+                              (name, f"{self.title}-{name.lower()}"))
+        self.term_ids.append(term_id)
+
+        return self.insert("INSERT INTO wp_term_taxonomy (term_id, taxonomy, description, parent, count) "
+                           "VALUES (%s, %s, '', 0, 0)", (term_id, taxonomy))
+
+    def add_post(self, number: int) -> int:
+
+        now = datetime.utcnow().replace(microsecond=0)
+        post_id = self.insert(
+            "INSERT INTO wp_posts (post_author, post_date, post_date_gmt, post_content, post_title, post_excerpt, "
+            "post_status, comment_status, ping_status, post_password, post_name, to_ping, pinged, post_modified, "
+            "post_modified_gmt, post_content_filtered, post_parent, guid, menu_order, post_type, post_mime_type, "
+            "comment_count) VALUES (0, %s, %s, '', %s, '', 'publish', 'closed', 'closed', '', %s, '', '', %s, %s, "
+            "'', 0, '', 0, 'event_listing', '', 0)",
+            (now, now, f"{self.title} #{number}", f"{self.title}-{number}", now, now))
+        self.post_ids.append(post_id)
+
+        self.insert("INSERT INTO wp_postmeta (post_id, meta_key, meta_value) VALUES (%s, '_hash_run_number', %s)",
+                    (post_id, str(number)))
+
+        return post_id
+
+    def seed(self) -> None:
+
+        regular_run = self.add_term("Regular Run", "event_listing_type")
+        full_moon_run = self.add_term("Full Moon Run", "event_listing_type")
+        news = self.add_term("News", "category")
+
+        for number in range(1, self.num_posts + 1):
+            post_id = self.add_post(number)
+            term_taxonomy_ids = [regular_run if number % 2 else full_moon_run]
+            # events can be assigned to multiple event types and to terms of other taxonomies
+            if number == 1:
+                term_taxonomy_ids += [full_moon_run, news]
+
+            for term_taxonomy_id in term_taxonomy_ids:
+                self.insert("INSERT INTO wp_term_relationships (object_id, term_taxonomy_id, term_order) "
+                            "VALUES (%s, %s, 0)", (post_id, term_taxonomy_id))
+
+    def remove_seed(self) -> None:
+
+        cursor = self.conn.session.cursor()
+        if len(self.post_ids) > 0:
+            post_ids = ",".join(map(str, self.post_ids))
+            cursor.execute(f"DELETE FROM wp_term_relationships WHERE object_id IN ({post_ids})")
+            cursor.execute(f"DELETE FROM wp_postmeta WHERE post_id IN ({post_ids})")
+            cursor.execute(f"DELETE FROM wp_posts WHERE ID IN ({post_ids})")
+        if len(self.term_ids) > 0:
+            term_ids = ",".join(map(str, self.term_ids))
+            cursor.execute(f"DELETE FROM wp_term_taxonomy WHERE term_id IN ({term_ids})")
+            cursor.execute(f"DELETE FROM wp_terms WHERE term_id IN ({term_ids})")
+        cursor.close()
+
+    def explain(self, query: str) -> List[dict]:
+        return DBConnection.execute_select_query(self.conn, f"EXPLAIN {query}")
+
+    def assert_event_types_looked_up_by_index(self, query: str) -> None:
+
+        plan = self.explain(query)
+
+        # event types must not be resolved via a materialized derived table of all term relationships
+        self.assertEqual([], [x for x in plan if str(x.get("table")).startswith("<derived")])
+
+        term_rows = [x for x in plan if x.get("table") in self.term_tables]
+        self.assertEqual(sorted(self.term_tables), sorted([x.get("table") for x in term_rows]))
+
+        # relationships and taxonomy are joined in the same lookup per post. An IN subquery on
+        # wp_term_taxonomy inside a LEFT JOIN condition can't be turned into a semi-join and
+        # would be evaluated separately.
+        self.assertEqual(1, len({x.get("id") for x in term_rows}))
+        self.assertEqual([], [x for x in plan if str(x.get("table")).startswith("<subquery")])
+
+        for row in term_rows:
+            with self.subTest(table=row.get("table")):
+                self.assertNotEqual("ALL", row.get("type"))
+                self.assertIsNotNone(row.get("key"))
+
+    def test_posts_query_plan(self):
+
+        posts = self.conn.get_posts(with_content=False, post_ids=self.post_ids)
+
+        self.assertEqual(sorted(self.post_ids), sorted([x.get("id") for x in posts]))
+        self.assertEqual("Regular Run", [x for x in posts if x.get("id") == self.post_ids[0]][0].get("post_type"))
+        self.assert_event_types_looked_up_by_index(self.queries[-1])
+
+    def test_post_with_meta_query_plan(self):
+
+        rows = self.conn.get_post_with_meta(self.post_ids[0])
+
+        self.assertEqual(1, len(rows))
+        self.assert_event_types_looked_up_by_index(self.queries[-1])
+
+
+@unittest.skipIf(os.environ.get("DATABASE_HOST") is None or os.environ.get("BINLOG_ENABLED") != "true",
+                 "no MySQL database with binlog configured")
+class TestMySQLBinlogConsumer(unittest.TestCase):
+
+    meta_key = "_hash_api_binlog_test"
+
+    def setUp(self) -> None:
+
+        if binlog.BinLogStreamReader is None:
+            self.skipTest("Python module 'mysql-replication' not installed")
+
+        self.conn = get_mysql_connection()
+        if self.conn.session is None:
+            self.skipTest("unable to connect to MySQL database")
+
+        posts = self.conn.get_posts(with_content=False, limit=1)
+        if len(posts) == 0:
+            self.skipTest("database contains no events")
+
+        self.post_id = posts[0].get("id")
+
+        self.store = event_store.setup_event_store()
+        self.store.known_post_ids.add(self.post_id)
+        self.evicted = list()
+        self.store.subscribe(lambda action, post_id: self.evicted.append((action, post_id)))
+
+        self.loop = asyncio.new_event_loop()
+        self.consumer = binlog.BinlogConsumer(BinlogConfigSettings(), DBSettings())
+
+    def tearDown(self) -> None:
+
+        self.consumer.stop()
+        self.delete_meta()
+        self.conn.close()
+        self.loop.close()
+        event_store.store = None
+
+    def delete_meta(self) -> None:
+        cursor = self.conn.session.cursor()
+        cursor.execute("DELETE FROM wp_postmeta WHERE post_id = %s AND meta_key = %s", (self.post_id, self.meta_key))
+        cursor.close()
+
+    def wait_for_eviction(self, timeout: float = 10) -> None:
+
+        async def wait():
+            for _ in range(int(timeout * 10)):
+                if len(self.evicted) > 0:
+                    return
+                await asyncio.sleep(0.1)
+
+        self.loop.run_until_complete(wait())
+
+    def test_meta_data_change_evicts_event(self):
+
+        self.assertIs(True, self.consumer.start(self.loop))
+
+        # give the consumer time to connect, only changes after connecting are streamed
+        self.loop.run_until_complete(asyncio.sleep(2))
+
+        self.conn.add_post_meta(self.post_id, self.meta_key, "1")
+        self.wait_for_eviction()
+
+        self.assertIn(("evict", self.post_id), self.evicted)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# EOF
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+"""
+    responses of the run endpoints need to be identical with and without event store,
+    no matter if runs get parsed (cold store) or are served from indexes and snapshot (warm store)
+"""
+
+from datetime import timedelta
+import unittest
+
+from fastapi.testclient import TestClient
+import pytz
+
+from tests.fake_db import setup_fake_db, get_test_app, first_start_date
+
+# start of run 22 as unix timestamp, all runs start in time zone Europe/Berlin
+run_22_start = int(pytz.timezone("Europe/Berlin").localize(first_start_date + timedelta(weeks=22 * 4)).timestamp())
+last_update_boundary = 1717200000
+
+queries = [
+    "/runs/all",
+    "/runs/all?limit=5",
+    "/runs/all?run_number=12",
+    "/runs/all?run_number__gt=30",
+    "/runs/all?run_number__lt=30",
+    "/runs/all?run_number__gt=30&limit=3",
+    f"/runs/all?start_date={run_22_start}",
+    f"/runs/all?start_date__gt={run_22_start}",
+    f"/runs/all?start_date__lt={run_22_start}",
+    f"/runs/all?last_update__gt={last_update_boundary}",
+    f"/runs/all?last_update__lt={last_update_boundary}",
+    "/runs/all?hares=alpha",
+    "/runs/all?hares=ALPHA&location_name=pub",
+    "/runs/all?event_name=run%20%231",
+    "/runs/all?kennel_name=moon",
+    "/runs/all?kennel_name=moon&run_number__lt=20",
+    "/runs/all?event_type=full&deleted=false",
+    "/runs/all?event_geographic_scope=promote-locally&deleted=true&limit=3",
+    "/runs/all?deleted=false&run_is_counted=true",
+    "/runs/all?q=beer",
+    "/runs/all?q=gamma&limit=3",
+    "/runs/all?near=52.4,13.4&radius_km=30",
+    "/runs/all?near=52.4,13.4&radius_km=3000&q=gamma",
+    "/runs/all?fields=id,start_date,run_number,event_name",
+    "/runs/all?fields=geo_lat,geo_long,geo_map_url&run_number__gt=40",
+    "/runs/all?fields=event_description,image_url,event_attributes&kennel_name=moon",
+    "/runs/all?near=91,13",
+    "/runs/all?fields=unknown",
+    "/runs/3",
+    "/runs/9",
+    "/runs/10",
+    "/runs/3?fields=id,end_date,event_url",
+    "/runs/9999",
+    f"/runs/calendar?start_date__gt={run_22_start}",
+    "/runs/stats",
+    "/runs/next"
+]
+
+
+class TestRunParity(unittest.TestCase):
+
+    def setUp(self) -> None:
+        setup_fake_db(60)
+
+    @staticmethod
+    def get_response(client: TestClient, query: str) -> tuple:
+        response = client.get(query)
+        return response.status_code, response.text
+
+    def test_store_parity(self):
+
+        client = TestClient(get_test_app(cache=False))
+        expected = {x: self.get_response(client, x) for x in queries}
+
+        # every query with an empty event store
+        cold = {x: self.get_response(TestClient(get_test_app(cache=True)), x) for x in queries}
+
+        # parse all runs once, afterwards listings are answered from indexes and snapshot
+        client = TestClient(get_test_app(cache=True))
+        client.get("/runs/all")
+        warm = {x: self.get_response(client, x) for x in queries}
+
+        for query in queries:
+            with self.subTest(query=query):
+                self.assertEqual(expected[query], cold[query])
+                self.assertEqual(expected[query], warm[query])
+
+    def test_range_boundaries(self):
+        """
+            greater and lower than filters of run attributes also match equal values
+        """
+
+        for cache in [False, True]:
+            client = TestClient(get_test_app(cache=cache))
+            client.get("/runs/all")
+
+            for query, included in [("/runs/all?run_number__gt=31", 31), ("/runs/all?run_number__lt=31", 31),
+                                    (f"/runs/all?start_date__gt={run_22_start}", 22)]:
+                with self.subTest(query=query, cache=cache):
+                    self.assertIn(included, [x.get("id") for x in client.get(query).json()])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# EOF
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+"""
+    runs are validated once when they get parsed, responses are serialized without validating them again.
+    The response bytes need to be identical to a response which FastAPI validates against the response model.
+"""
+
+from typing import List
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.models.run import Hash, HashParams
+from api.factory.runs import get_hash_runs
+from common.misc import dump_json
+import source.event_store as event_store
+from tests.fake_db import setup_fake_db, get_test_app
+
+
+def get_validating_app() -> FastAPI:
+    """
+        return app which serves the parsed runs the way FastAPI does by default, validating each run
+        against the response model
+    """
+
+    app = FastAPI()
+
+    @app.get("/runs/all", response_model=List[Hash])
+    async def get_runs():
+        # noinspection PyArgumentList
+        return get_hash_runs(HashParams())
+
+    @app.get("/runs/{post_id}", response_model=Hash)
+    async def get_run(post_id: int):
+        # noinspection PyArgumentList
+        return get_hash_runs(HashParams(), post_ids=[post_id])[0]
+
+    return app
+
+
+class TestSerializationEquivalence(unittest.TestCase):
+
+    def setUp(self) -> None:
+        session = setup_fake_db(120)
+        session.db.execute("UPDATE wp_postmeta SET meta_value = 'Café „Größe“ \\ 🍺' "
+                           "WHERE post_id = 3 AND meta_key = '_event_location'")
+
+    def get_validated(self, path: str) -> bytes:
+        event_store.store = None
+        return TestClient(get_validating_app()).get(path).content
+
+    def test_listing_identical_to_validated_response(self):
+
+        expected = self.get_validated("/runs/all")
+
+        self.assertEqual(expected, TestClient(get_test_app(cache=False)).get("/runs/all").content)
+
+        # cold store parses all runs, warm store serves stored runs and serialized fragments
+        client = TestClient(get_test_app(cache=True))
+        self.assertEqual(expected, client.get("/runs/all").content)
+        event_store.get_event_store().responses.clear()
+        self.assertEqual(expected, client.get("/runs/all").content)
+
+    def test_runs_identical_to_validated_response(self):
+
+        client = TestClient(get_test_app(cache=True))
+        store = event_store.get_event_store()
+
+        for post_id in [1, 3, 4, 9, 22, 119]:
+            with self.subTest(post_id=post_id):
+                expected = self.get_validated(f"/runs/{post_id}")
+                event_store.store = store
+
+                self.assertEqual(expected, client.get(f"/runs/{post_id}").content)
+                self.assertEqual(expected, dump_json(store.get(post_id)))
+                self.assertEqual(expected, store.get_fragment(store.get(post_id)))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# EOF
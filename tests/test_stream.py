@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#  Copyright (c) 2022 Ricardo Bartels. All rights reserved.
+#
+#  wordpress-hash-event-api
+#
+#  This work is licensed under the terms of the MIT license.
+#  For a copy, see file LICENSE.txt included in this
+#  repository or visit: <https://opensource.org/licenses/MIT>.
+
+"""
+    the run stream syncs evicted events within the event loop and resets clients which fall behind
+"""
+
+import asyncio
+from datetime import timedelta
+import unittest
+from unittest import mock
+
+from api.stream import RunEventBroadcaster
+import api.stream as stream
+import source.event_store as event_store
+from tests.fake_db import setup_fake_db, get_test_app, last_modified
+
+
+class TestRunEventBroadcaster(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.session = setup_fake_db(30)
+        get_test_app(cache=True)
+
+        self.store = event_store.get_event_store()
+        self.loop = asyncio.new_event_loop()
+
+        RunEventBroadcaster.sync_page_size = 7
+        self.addCleanup(lambda: setattr(RunEventBroadcaster, "sync_page_size", 100))
+
+        self.broadcaster = RunEventBroadcaster(self.store, self.loop)
+        self.run_loop()
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    def run_loop(self) -> None:
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+
+    def test_initial_sync_in_pages(self):
+
+        self.assertEqual(27, len(self.store.known_post_ids))
+        self.assertIsNotNone(self.store.known_post_ids_synced)
+        self.assertEqual(27, len([x for x in self.broadcaster.history if "event: insert" in x[1]]))
+
+    def test_sync_only_evicted_events(self):
+
+        self.broadcaster.sync_delay = 0
+        self.session.db.execute("UPDATE wp_posts SET post_modified = ? WHERE id = 3",
+                                (last_modified + timedelta(days=1),))
+
+        with mock.patch.object(stream, "get_hash_runs", wraps=stream.get_hash_runs) as get_hash_runs:
+            self.store.evict(3)
+            self.run_loop()
+
+        self.assertEqual([[3]], [x.kwargs.get("post_ids") for x in get_hash_runs.call_args_list])
+        self.assertIn("event: update", self.broadcaster.history[-1][1])
+
+    def test_slow_client_gets_reset(self):
+
+        self.broadcaster.client_queue_size = 2
+
+        async def read_after_overflow():
+            client = self.broadcaster.stream()
+            first = self.loop.create_task(client.__anext__())
+            await asyncio.sleep(0)
+
+            for post_id in range(5):
+                self.broadcaster.publish("purge", {"id": post_id})
+
+            message = await first
+            await client.aclose()
+            return message
+
+        self.assertIn("event: reset", self.loop.run_until_complete(read_after_overflow()))
+        self.assertEqual(0, len(self.broadcaster.clients))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# EOF